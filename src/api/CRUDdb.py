@@ -1,16 +1,144 @@
 # src/api/CRUDdb.py
-from fastapi import APIRouter, HTTPException, Path, Response, status
-from fastapi.openapi.models import Response
+import base64
+import json
+from fastapi import APIRouter, HTTPException, Path, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List
-import pandas as pd
-from utils import bot_utils
+from typing import List, Optional
+from utils.cache import TTLCache, all_stats as cache_stats, table_versions
+from utils.index_sync import index_sync
+from utils.invalidation_bus import invalidation_bus
+from utils.lexical_index import lexical_index
+from utils.semantic_cache import answer_cache
+from utils.rule_index import rule_index
 import sql as sql_module
 
 # Initialize connection
 router = APIRouter()
 
-chat_history = []
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_BULK_ROWS = 5000
+
+# Read-through caches for the rarely changing tables. Keys: "all" and ("id", id).
+# Rules per item and per category are served from rule_index instead
+kategori_cache = TTLCache("kategorier")
+regelverk_cache = TTLCache("regelverker")
+
+
+# Called by the write handlers after commit. Bumps the table versions used for ETags,
+# evicts only the cache keys the write can affect, marks the changed ids in rule_index,
+# queues the affected items for re-embedding and tells the other workers through the invalidation bus.
+# With remote=True the event came from another worker. That worker re-embeds itself unless it runs
+# without the index sync (--role crud), then reindex=True asks the receiving workers to do it.
+# The lexical index is rebuilt from Chroma, so it is only dropped on the "reindexed" event.
+def invalidate_kategori(kategoriid=None, deleted=False, remote=False, reindex=False):
+    if deleted:
+        # Items and rules referencing the category may have been removed with it
+        table_versions.bump("kategorier", "gjenstander", "regelverker", "regelverktag")
+        regelverk_cache.clear()
+        rule_index.mark_all()
+    else:
+        table_versions.bump("kategorier")
+    kategori_cache.invalidate("all", ("id", kategoriid))
+    answer_cache.clear()
+    if not remote or reindex:
+        index_sync.enqueue("kategori", kategoriid)
+    if not remote:
+        invalidation_bus.publish("kategori", kategoriid=kategoriid, deleted=deleted, reindex=not index_sync.running)
+
+
+def invalidate_gjenstand(gjenstandid=None, deleted=False, remote=False, reindex=False):
+    if deleted:
+        table_versions.bump("gjenstander", "regelverktag")
+    else:
+        table_versions.bump("gjenstander")
+    rule_index.mark_item(gjenstandid)
+    answer_cache.clear()
+    if not remote or reindex:
+        index_sync.enqueue("gjenstand", gjenstandid)
+    if not remote:
+        invalidation_bus.publish("gjenstand", gjenstandid=gjenstandid, deleted=deleted, reindex=not index_sync.running)
+
+
+def invalidate_regelverk(regelverkid=None, kategoriid=None, deleted=False, remote=False, reindex=False):
+    if deleted:
+        table_versions.bump("regelverker", "regelverktag")
+    else:
+        table_versions.bump("regelverker")
+    regelverk_cache.invalidate("all", ("id", regelverkid))
+    rule_index.mark_rule(regelverkid)
+    answer_cache.clear()
+    if not remote or reindex:
+        index_sync.enqueue("regelverk", regelverkid)
+    if not remote:
+        invalidation_bus.publish("regelverk", regelverkid=regelverkid, kategoriid=kategoriid, deleted=deleted,
+                                 reindex=not index_sync.running)
+
+
+def invalidate_regelverktag(gjenstandid=None, regelverkid=None, remote=False, reindex=False):
+    table_versions.bump("regelverktag")
+    if gjenstandid is not None:
+        rule_index.mark_item(gjenstandid)
+    else:
+        rule_index.mark_rule(regelverkid)
+    answer_cache.clear()
+    if not remote or reindex:
+        if gjenstandid is not None:
+            index_sync.enqueue("gjenstand", gjenstandid)
+        else:
+            index_sync.enqueue("regelverk", regelverkid)
+    if not remote:
+        invalidation_bus.publish("regelverktag", gjenstandid=gjenstandid, regelverkid=regelverkid,
+                                 reindex=not index_sync.running)
+
+
+# Published by index_sync once the changed documents are in Chroma. Rebuilding the lexical index or
+# caching answers before that would use the old documents until the next write.
+def invalidate_reindexed(remote=False):
+    lexical_index.invalidate()
+    answer_cache.clear()
+
+
+REMOTE_INVALIDATIONS = {
+    "kategori": invalidate_kategori,
+    "gjenstand": invalidate_gjenstand,
+    "regelverk": invalidate_regelverk,
+    "regelverktag": invalidate_regelverktag,
+    "reindexed": invalidate_reindexed,
+}
+
+
+def apply_remote_invalidation(kind, args):
+    REMOTE_INVALIDATIONS[kind](remote=True, **args)
+
+
+# Notifications sent while the listener was disconnected are lost, so everything is dropped
+def invalidate_all():
+    table_versions.bump("kategorier", "gjenstander", "regelverker", "regelverktag")
+    kategori_cache.clear()
+    regelverk_cache.clear()
+    rule_index.mark_all()
+    answer_cache.clear()
+    lexical_index.invalidate()
+
+
+invalidation_bus.subscribe(apply_remote_invalidation, on_reconnect=invalidate_all)
+
+
+# Sets a strong ETag on the response and returns a 304 response if the client already has it.
+# The version is read before the database is queried, so a racing write can only make the tag older.
+def check_etag(request, response, tables, key=""):
+    etag = table_versions.etag(tables, key)
+    response.headers["ETag"] = etag
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        if "*" in tags or etag in tags:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return None
+
+
 # Defined Pydantic models based on my TypeScript interfaces
 class Kategori(BaseModel):
     kategoriid: int
@@ -95,23 +223,117 @@ class DeleteRegelverkTagByItem(BaseModel):
     gjenstandid: int
 
 
+class BulkUpdateGjenstand(UpdateGjenstand):
+    gjenstandid: int
+
+
+class BulkUpdateRegelverk(UpdateRegelverk):
+    regelverkid: int
+
+
+class BulkDelete(BaseModel):
+    ids: List[int]
+
+
+class BulkResult(BaseModel):
+    index: int
+    status: str
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
+
+class BulkResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BulkResult]
+
+
 @router.get("/")
 async def all():
     return {"message": "Welcome to the SmartPack API!"}
 
 
-@router.get("/query/{query}")
-async def query(query: str):
-    response = bot_utils.collection.query(
-        query_texts=[query],  # Chroma will embed this
-        n_results=5  # returns 5 results, change this if you want more or less
-    )
-    result_from_chroma = bot_utils.format_nicely(response)
-    formatted_results_str = "\n\n".join(result_from_chroma)
-    openai_result, user_input = bot_utils.openai_completion(query, formatted_results_str, chat_history)
-    chat_history.append((user_input, openai_result.choices[0].message.content))  # Ensure it's a tuple
+@router.get("/stats/db")
+async def db_stats():
+    return sql_module.pool_stats()
+
+
+@router.get("/stats/cache")
+async def get_cache_stats():
+    return cache_stats()
+
 
-    return {"response": openai_result.choices[0].message.content}
+@router.get("/stats/bus")
+async def get_bus_stats():
+    return {**invalidation_bus.stats, "channel": invalidation_bus.channel, "origin": invalidation_bus.origin}
+
+
+@router.get("/stats/index")
+async def get_index_stats():
+    return {**index_sync.stats, "pending": index_sync.pending(), "lexical": lexical_index.stats}
+
+
+# Bulk writes run in a single transaction, see sql_module.execute_bulk for per-row error handling
+async def run_bulk(query, rows, key=None):
+    if len(rows) > MAX_BULK_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_ROWS} rows per bulk request")
+    try:
+        return await sql_module.execute_bulk_async(query, rows, key)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+
+def bulk_response(results, id_field, success_status):
+    items = []
+    for index, (row, error) in enumerate(results):
+        if error:
+            items.append(BulkResult(index=index, status="error", detail=error))
+        elif row is None:
+            items.append(BulkResult(index=index, status="not_found"))
+        else:
+            items.append(BulkResult(index=index, status=success_status, id=row.get(id_field)))
+    succeeded = sum(1 for item in items if item.status == success_status)
+    return BulkResponse(succeeded=succeeded, failed=len(items) - succeeded, results=items)
+
+
+# Keyset pagination. The cursor is the sort key of the last row on the previous page,
+# key_fields pairs each ORDER BY column with the name it has in the result rows.
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, length):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != length:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+async def read_page(query, key_fields, response, limit, after):
+    keyset, params = "", None
+    if after is not None:
+        columns = ", ".join(column for column, _ in key_fields)
+        placeholders = ", ".join(["%s"] * len(key_fields))
+        keyset = f"WHERE ({columns}) > ({placeholders})"
+        params = tuple(decode_cursor(after, len(key_fields)))
+        limit = limit or DEFAULT_PAGE_SIZE
+    page = f"LIMIT {int(limit)}" if limit else ""
+    rows = await sql_module.fetch_rows_async(query.format(keyset=keyset, limit=page), params)
+    if limit and len(rows) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor([rows[-1][field] for _, field in key_fields])
+    return rows
+
+
+async def ndjson_lines(rows):
+    async for row in rows:
+        yield json.dumps(row, default=str, ensure_ascii=False) + "\n"
+
+
+def stream_response(query):
+    return StreamingResponse(ndjson_lines(sql_module.stream_rows(query)), media_type="application/x-ndjson")
 
 
 # Kategorier
@@ -124,70 +346,73 @@ async def create_category(category: CreateKategori):
     RETURNING kategoriid, navn AS kategorinavn, beskrivelse AS kategoribeskrivelse;
     """
     values = (category.kategorinavn, category.kategoribeskrivelse)
-    conn = sql_module.create_connection()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Failed to connect to the database")
-
     try:
-        with conn.cursor() as cur:
-            cur.execute(query, values)
-            data = cur.fetchone()
-            conn.commit()
-            if not data:
-                raise HTTPException(status_code=500, detail="Failed to create category")
-            data_dict = dict(zip([desc[0] for desc in cur.description], data))
-        return Kategori(**data_dict)
+        data = await sql_module.execute_async(query, values, fetch="one", commit=True)
     except Exception as e:
-        conn.rollback()
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
-    finally:
-        conn.close()
+    if not data:
+        raise HTTPException(status_code=500, detail="Failed to create category")
+    invalidate_kategori()
+    return Kategori(**data)
 
 
 # READ
 @router.get("/kategorier/read/", response_model=List[Kategori])
-async def get_categories():
+async def get_categories(request: Request, response: Response,
+                         limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                         after: Optional[str] = None):
     query = """
     SELECT kategoriid, navn AS kategorinavn, beskrivelse AS kategoribeskrivelse
     FROM kategorier
-    ORDER BY navn;
+    {keyset}
+    ORDER BY navn, kategoriid
+    {limit};
     """
-    conn = sql_module.create_connection()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Failed to connect to the database")
-
+    key_fields = [("navn", "kategorinavn"), ("kategoriid", "kategoriid")]
+    not_modified = check_etag(request, response, ["kategorier"], f"{limit}:{after}")
+    if not_modified:
+        return not_modified
     try:
-        result = sql_module.execute_query(conn, query)
-        data = result.to_dict(orient='records')
-        return data
+        if limit is None and after is None:
+            return await kategori_cache.get_or_load(
+                "all", lambda: read_page(query, key_fields, response, None, None))
+        return await read_page(query, key_fields, response, limit, after)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
-    finally:
-        conn.close()
+
+
+# Streamer alle kategorier som NDJSON
+@router.get("/kategorier/read/stream")
+async def stream_categories():
+    query = """
+    SELECT kategoriid, navn AS kategorinavn, beskrivelse AS kategoribeskrivelse
+    FROM kategorier
+    ORDER BY navn, kategoriid;
+    """
+    return stream_response(query)
 
 
 @router.get("/kategorier/read/id/{kategoriid}", response_model=Kategori)
-async def get_category(kategoriid: int):
+async def get_category(kategoriid: int, request: Request, response: Response):
     query = """
     SELECT kategoriid, navn AS kategorinavn, beskrivelse AS kategoribeskrivelse
     FROM kategorier
     WHERE kategoriid = %s;
     """
-    conn = sql_module.create_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Failed to connect to database")
-
+    not_modified = check_etag(request, response, ["kategorier"], kategoriid)
+    if not_modified:
+        return not_modified
     try:
-        result = sql_module.execute_query(conn, query, (kategoriid,))
-        if not result.empty:
-            return Kategori(**result.iloc[0].to_dict())
-        else:
-            raise HTTPException(status_code=404, detail="Category not found")
+        data = await kategori_cache.get_or_load(
+            ("id", kategoriid), lambda: sql_module.fetch_one_async(query, (kategoriid,)))
     except Exception as e:
         print(f"Error while fetching category: {e}")
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
-    finally:
-        conn.close()
+    if not data:
+        raise HTTPException(status_code=404, detail="Category not found")
+    return Kategori(**data)
 
 
 # UPDATE
@@ -200,47 +425,28 @@ async def update_category(kategoriid: int, category: UpdateKategori):
     RETURNING kategoriid, navn AS kategorinavn, beskrivelse AS kategoribeskrivelse;
     """
     values = (category.kategorinavn, category.kategoribeskrivelse, kategoriid)
-    conn = sql_module.create_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Failed to connect to database")
-
     try:
-        with conn.cursor() as cur:
-            cur.execute(query, values)
-            data = cur.fetchone()
-            conn.commit()
-            if data:
-                data_dict = dict(zip([desc[0] for desc in cur.description], data))
-                return Kategori(**data_dict)
-            else:
-                raise HTTPException(status_code=404, detail="Category not found")
+        data = await sql_module.execute_async(query, values, fetch="one", commit=True)
     except Exception as e:
-        conn.rollback()
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
-    finally:
-        conn.close()
+    if not data:
+        raise HTTPException(status_code=404, detail="Category not found")
+    invalidate_kategori(kategoriid)
+    return Kategori(**data)
 
 
-# DELETE Her er feil, sletter i databasen men feil uansett
+# DELETE
 @router.delete("/kategorier/delete/{kategoriid}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_category(kategoriid: int):
     query = "DELETE FROM kategorier WHERE kategoriid = %s"
-    conn = sql_module.create_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Failed to connect to database")
-
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(query, (kategoriid,))
-            if cursor.rowcount == 0:
-                raise HTTPException(status_code=404, detail="Category not found")
-            conn.commit()
-        return Response(status_code=status.HTTP_204_NO_CONTENT)
+        affected_rows = await sql_module.execute_async(query, (kategoriid,), commit=True)
     except Exception as e:
-        conn.rollback()
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
-    finally:
-        conn.close()
+    if affected_rows == 0:
+        raise HTTPException(status_code=404, detail="Category not found")
+    invalidate_kategori(kategoriid, deleted=True)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
 # Gjenstander
@@ -253,73 +459,70 @@ async def create_item(item: CreateGjenstand):
     RETURNING gjenstandid, gjenstandnavn, beskrivelse AS gjenstandbeskrivelse, kategoriid;
     """
     values = (item.gjenstandnavn, item.gjenstandbeskrivelse, item.kategoriid)
-    conn = sql_module.create_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Failed to connect to database")
-
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(query, values)
-            result = cursor.fetchone()
-            conn.commit()
-            if result:
-                data = dict(zip([desc[0] for desc in cursor.description], result))
-                return Gjenstand(**data)
-            else:
-                raise HTTPException(status_code=404, detail="Failed to insert the item")
+        data = await sql_module.execute_async(query, values, fetch="one", commit=True)
     except Exception as e:
-        conn.rollback()
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
-    finally:
-        conn.close()
+    if not data:
+        raise HTTPException(status_code=404, detail="Failed to insert the item")
+    invalidate_gjenstand(data["gjenstandid"])
+    return Gjenstand(**data)
 
 
 # READ
 # Leser alle gjenstander i orden av gjenstandnavn
 @router.get("/gjenstander/read/", response_model=List[Gjenstand])
-async def get_all_items():
+async def get_all_items(request: Request, response: Response,
+                        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                        after: Optional[str] = None):
     query = """
     SELECT gjenstandid, gjenstandnavn, beskrivelse AS gjenstandbeskrivelse, kategoriid
     FROM gjenstander
-    ORDER BY gjenstandnavn;
+    {keyset}
+    ORDER BY gjenstandnavn, gjenstandid
+    {limit};
     """
-    conn = sql_module.create_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Failed to connect to database")
-
+    key_fields = [("gjenstandnavn", "gjenstandnavn"), ("gjenstandid", "gjenstandid")]
+    not_modified = check_etag(request, response, ["gjenstander"], f"{limit}:{after}")
+    if not_modified:
+        return not_modified
     try:
-        result = sql_module.execute_query(conn, query)
-        data = result.to_dict(orient='records')
-        return data
+        return await read_page(query, key_fields, response, limit, after)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
 
 
-# Les gjenstander basert på gjenstandid // Får feilmeldinger og burde bruke sqlalchemy
+# Streamer alle gjenstander som NDJSON
+@router.get("/gjenstander/read/stream")
+async def stream_items():
+    query = """
+    SELECT gjenstandid, gjenstandnavn, beskrivelse AS gjenstandbeskrivelse, kategoriid
+    FROM gjenstander
+    ORDER BY gjenstandnavn, gjenstandid;
+    """
+    return stream_response(query)
+
+
+# Les gjenstander basert på gjenstandid
 @router.get("/gjenstander/read/id/{gjenstandid}", response_model=Gjenstand)
-async def get_item_by_id(gjenstandid: int):
+async def get_item_by_id(gjenstandid: int, request: Request, response: Response):
     query = """
     SELECT gjenstandid, gjenstandnavn, beskrivelse AS gjenstandbeskrivelse, kategoriid
     FROM gjenstander
     WHERE gjenstandid = %s;
     """
-    conn = sql_module.create_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Failed to connect to database")
-
+    not_modified = check_etag(request, response, ["gjenstander"], gjenstandid)
+    if not_modified:
+        return not_modified
     try:
-        result = pd.read_sql_query(query, conn, params=(gjenstandid,))
-        if not result.empty:
-            data = result.iloc[0].to_dict()
-            return Gjenstand(**data)
-        else:
-            raise HTTPException(status_code=404, detail="Item not found")
+        data = await sql_module.fetch_one_async(query, (gjenstandid,))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
+    if not data:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return Gjenstand(**data)
 
 
 # Les gjenstander basert på gjenstandnavn
@@ -332,24 +535,13 @@ async def get_items_by_name(gjenstandnavn: str = Path(..., description="Navn på
     ORDER BY gjenstandnavn;
     """
     like_pattern = f'%{gjenstandnavn}%'
-    conn = sql_module.create_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Failed to connect to database")
-
     try:
-        with conn.cursor() as cur:
-            cur.execute(query, (like_pattern,))
-            rows = cur.fetchall()
-            if rows:
-                columns = [desc[0] for desc in cur.description]
-                data = [dict(zip(columns, row)) for row in rows]
-                return data
-            else:
-                raise HTTPException(status_code=404, detail="No items found")
+        data = await sql_module.execute_async(query, (like_pattern,), fetch="all")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An SQL error occurred: {str(e)}")
-    finally:
-        conn.close()
+    if not data:
+        raise HTTPException(status_code=404, detail="No items found")
+    return data
 
 
 # Les gjenstander baseert på kategoriid
@@ -361,18 +553,10 @@ async def get_items(kategoriid: int):
     WHERE kategoriid = %s
     ORDER BY gjenstandnavn;
     """
-    conn = sql_module.create_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Failed to connect to database")
-
     try:
-        result = sql_module.execute_query(conn, query, (kategoriid,))
-        data = result.to_dict(orient='records')
-        return data
+        return await sql_module.fetch_rows_async(query, (kategoriid,))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
 
 
 # UPDATE
@@ -385,48 +569,77 @@ async def update_item(gjenstandid: int, item: UpdateGjenstand):
     RETURNING gjenstandid, gjenstandnavn, beskrivelse AS gjenstandbeskrivelse, kategoriid;
     """
     values = (item.gjenstandnavn, item.gjenstandbeskrivelse, item.kategoriid, gjenstandid)
-    conn = sql_module.create_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Failed to connect to database")
-
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(query, values)
-            conn.commit()
-            result = cursor.fetchone()
-            if result:
-                data = dict(zip([desc[0] for desc in cursor.description], result))
-                return Gjenstand(**data)
-            else:
-                raise HTTPException(status_code=404, detail="Item not found")
+        data = await sql_module.execute_async(query, values, fetch="one", commit=True)
     except Exception as e:
-        conn.rollback()
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
-    finally:
-        conn.close()
+    if not data:
+        raise HTTPException(status_code=404, detail="Item not found")
+    invalidate_gjenstand(gjenstandid)
+    return Gjenstand(**data)
 
 
-# DELETE Sletter men for feilmelding
+# DELETE
 @router.delete("/gjenstander/delete/{gjenstandid}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_item(gjenstandid: int):
     query = "DELETE FROM gjenstander WHERE gjenstandid = %s"
-    conn = sql_module.create_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Failed to connect to database")
-
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(query, (gjenstandid,))
-            if cursor.rowcount == 0:
-                conn.rollback()
-                raise HTTPException(status_code=404, detail="Item not found")
-            conn.commit()
-        return Response(status_code=status.HTTP_204_NO_CONTENT)
+        affected_rows = await sql_module.execute_async(query, (gjenstandid,), commit=True)
     except Exception as e:
-        conn.rollback()
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
-    finally:
-        conn.close()
+    if affected_rows == 0:
+        raise HTTPException(status_code=404, detail="Item not found")
+    invalidate_gjenstand(gjenstandid, deleted=True)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+# BULK
+@router.post("/gjenstander/bulk/", response_model=BulkResponse)
+async def create_items_bulk(items: List[CreateGjenstand]):
+    query = """
+    INSERT INTO gjenstander (gjenstandnavn, beskrivelse, kategoriid)
+    VALUES %s
+    RETURNING gjenstandid;
+    """
+    rows = [(item.gjenstandnavn, item.gjenstandbeskrivelse, item.kategoriid) for item in items]
+    results = await run_bulk(query, rows)
+    for row, _ in results:
+        if row:
+            invalidate_gjenstand(row["gjenstandid"])
+    return bulk_response(results, "gjenstandid", "created")
+
+
+@router.put("/gjenstander/bulk/update", response_model=BulkResponse)
+async def update_items_bulk(items: List[BulkUpdateGjenstand]):
+    query = """
+    UPDATE gjenstander g
+    SET gjenstandnavn = v.gjenstandnavn, beskrivelse = v.beskrivelse, kategoriid = v.kategoriid
+    FROM (VALUES %s) AS v(gjenstandid, gjenstandnavn, beskrivelse, kategoriid)
+    WHERE g.gjenstandid = v.gjenstandid
+    RETURNING g.gjenstandid;
+    """
+    rows = [(item.gjenstandid, item.gjenstandnavn, item.gjenstandbeskrivelse, item.kategoriid) for item in items]
+    results = await run_bulk(query, rows, key=[(0, "gjenstandid")])
+    for row, _ in results:
+        if row:
+            invalidate_gjenstand(row["gjenstandid"])
+    return bulk_response(results, "gjenstandid", "updated")
+
+
+@router.delete("/gjenstander/bulk/delete", response_model=BulkResponse)
+async def delete_items_bulk(items: BulkDelete):
+    query = """
+    DELETE FROM gjenstander g
+    USING (VALUES %s) AS v(gjenstandid)
+    WHERE g.gjenstandid = v.gjenstandid
+    RETURNING g.gjenstandid;
+    """
+    rows = [(gjenstandid,) for gjenstandid in items.ids]
+    results = await run_bulk(query, rows, key=[(0, "gjenstandid")])
+    for row, _ in results:
+        if row:
+            invalidate_gjenstand(row["gjenstandid"], deleted=True)
+    return bulk_response(results, "gjenstandid", "deleted")
 
 
 # Regelverker
@@ -446,32 +659,22 @@ async def create_regelverk(regelverk: CreateRegelverk):
         regelverk.tillattinnsjekketbagasje,
         regelverk.regelverkbeskrivelse
     )
-    conn = sql_module.create_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Failed to connect to database")
-
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(query, values)
-            conn.commit()
-            result = cursor.fetchone()
-            if result:
-                columns = [col[0] for col in cursor.description]
-                data = dict(zip(columns, result))
-                return Regelverk(**data)
-            else:
-                raise HTTPException(status_code=404, detail="Failed to insert regelverk")
+        data = await sql_module.execute_async(query, values, fetch="one", commit=True)
     except Exception as e:
-        conn.rollback()
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
-    finally:
-        conn.close()
+    if not data:
+        raise HTTPException(status_code=404, detail="Failed to insert regelverk")
+    invalidate_regelverk(data["regelverkid"], data["kategoriid"])
+    return Regelverk(**data)
 
 
 # READ
 # Henter alle i rekkefølge av kategoriid
 @router.get("/regelverker/read/", response_model=List[Regelverk])
-async def get_regelverk():
+async def get_regelverk(request: Request, response: Response,
+                        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                        after: Optional[str] = None):
     query = """
     SELECT 
         r.regelverkid, 
@@ -484,79 +687,73 @@ async def get_regelverk():
         COALESCE(r.beskrivelse, '') AS regelverkbeskrivelse
     FROM regelverker r
     INNER JOIN kategorier k ON r.kategoriid = k.kategoriid
-    ORDER BY r.kategoriid;
+    {keyset}
+    ORDER BY r.kategoriid, r.regelverkid
+    {limit};
     """
-    conn = sql_module.create_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Failed to connect to database")
-
+    key_fields = [("r.kategoriid", "kategoriid"), ("r.regelverkid", "regelverkid")]
+    not_modified = check_etag(request, response, ["regelverker", "kategorier"], f"{limit}:{after}")
+    if not_modified:
+        return not_modified
     try:
-        result = pd.read_sql_query(query, conn)
-        if not result.empty:
-            data = result.to_dict(orient='records')
-            return data
+        if limit is None and after is None:
+            data = await regelverk_cache.get_or_load(
+                "all", lambda: read_page(query, key_fields, response, None, None))
         else:
-            raise HTTPException(status_code=404, detail="No regelverk found")
+            data = await read_page(query, key_fields, response, limit, after)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
+    if not data and after is None:
+        raise HTTPException(status_code=404, detail="No regelverk found")
+    return data
+
+
+# Streamer alle regelverker som NDJSON
+@router.get("/regelverker/read/stream")
+async def stream_regelverk():
+    query = """
+    SELECT r.regelverkid, r.kategoriid, r.betingelse, r.verdi, r.tillatthandbagasje, r.tillattinnsjekketbagasje,
+           COALESCE(r.beskrivelse, '') AS regelverkbeskrivelse
+    FROM regelverker r
+    INNER JOIN kategorier k ON r.kategoriid = k.kategoriid
+    ORDER BY r.kategoriid, r.regelverkid;
+    """
+    return stream_response(query)
 
 
 # Hent basert på regelverkID
 @router.get("/regelverker/read/id/{regelverkid}", response_model=Regelverk)
-async def get_regelverk_by_id(regelverkid: int):
+async def get_regelverk_by_id(regelverkid: int, request: Request, response: Response):
     query = """
     SELECT regelverkid, kategoriid, betingelse, verdi, tillatthandbagasje, tillattinnsjekketbagasje, COALESCE(beskrivelse, '') AS regelverkbeskrivelse
     FROM regelverker
     WHERE regelverkid = %s;
     """
-    conn = sql_module.create_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Failed to connect to database")
-
+    not_modified = check_etag(request, response, ["regelverker"], regelverkid)
+    if not_modified:
+        return not_modified
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(query, (regelverkid,))
-            data = cursor.fetchone()
-            if data:
-                columns = [col[0] for col in cursor.description]
-                data_dict = dict(zip(columns, data))
-                return Regelverk(**data_dict)
-            else:
-                raise HTTPException(status_code=404, detail="Regelverk not found")
+        data = await regelverk_cache.get_or_load(
+            ("id", regelverkid), lambda: sql_module.execute_async(query, (regelverkid,), fetch="one"))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
-    finally:
-        conn.close()
+    if not data:
+        raise HTTPException(status_code=404, detail="Regelverk not found")
+    return Regelverk(**data)
 
 
 # Hent basert på kategoriID
 @router.get("/regelverker/read/kategori/{kategoriid}", response_model=List[Regelverk])
 async def get_regelverk_by_kategori(kategoriid: int):
-    query = """
-    SELECT regelverkid, kategoriid, betingelse, verdi, tillatthandbagasje, tillattinnsjekketbagasje, COALESCE(beskrivelse, '') AS regelverkbeskrivelse
-    FROM regelverker
-    WHERE kategoriid = %s
-    ORDER BY kategoriid;
-    """
-    conn = sql_module.create_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Failed to connect to database")
-
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(query, (kategoriid,))
-            records = cursor.fetchall()
-            data = [dict(zip([column[0] for column in cursor.description], row)) for row in records]
-            if data:
-                return data
-            else:
-                raise HTTPException(status_code=404, detail="No regelverk found for the specified category")
+        data = await rule_index.rules_for_category(kategoriid)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
+    if not data:
+        raise HTTPException(status_code=404, detail="No regelverk found for the specified category")
+    return data
 
 
 # UPDATE
@@ -576,49 +773,84 @@ async def update_regelverk(regelverkid: int, regelverk: UpdateRegelverk):
         regelverk.regelverkbeskrivelse,
         regelverkid
     )
-    conn = sql_module.create_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Failed to connect to database")
-
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(query, values)
-            conn.commit()
-            data = cursor.fetchone()
-            if data:
-                columns = [col[0] for col in cursor.description]
-                data_dict = dict(zip(columns, data))
-                return Regelverk(**data_dict)
-            else:
-                raise HTTPException(status_code=404, detail="Regelverk not found")
+        data = await sql_module.execute_async(query, values, fetch="one", commit=True)
     except Exception as e:
-        conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
+    if not data:
+        raise HTTPException(status_code=404, detail="Regelverk not found")
+    invalidate_regelverk(regelverkid, data["kategoriid"])
+    return Regelverk(**data)
 
 
-# DELETE //Den sletter men kommer opp feilmelding
+# DELETE
 @router.delete("/regelverker/delete/{regelverkid}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_regelverk(regelverkid: int = Path(..., description="The ID of the regelverk to delete")):
-    query = "DELETE FROM regelverker WHERE regelverkid = %s"
-    conn = sql_module.create_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Failed to connect to database")
-
+    query = "DELETE FROM regelverker WHERE regelverkid = %s RETURNING kategoriid"
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(query, (regelverkid,))
-            affected_rows = cursor.rowcount
-            conn.commit()
-            if affected_rows == 0:
-                raise HTTPException(status_code=404, detail="Regelverk not found")
-        return Response(status_code=status.HTTP_204_NO_CONTENT)
+        deleted = await sql_module.execute_async(query, (regelverkid,), fetch="one", commit=True)
     except Exception as e:
-        conn.rollback()
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
-    finally:
-        conn.close()
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Regelverk not found")
+    invalidate_regelverk(regelverkid, deleted["kategoriid"], deleted=True)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+# BULK
+@router.post("/regelverker/bulk/", response_model=BulkResponse)
+async def create_regelverk_bulk(regelverker: List[CreateRegelverk]):
+    query = """
+    INSERT INTO regelverker (kategoriid, betingelse, verdi, tillatthandbagasje, tillattinnsjekketbagasje, beskrivelse)
+    VALUES %s
+    RETURNING regelverkid, kategoriid;
+    """
+    rows = [
+        (r.kategoriid, r.betingelse, r.verdi, r.tillatthandbagasje, r.tillattinnsjekketbagasje, r.regelverkbeskrivelse)
+        for r in regelverker
+    ]
+    results = await run_bulk(query, rows)
+    for row, _ in results:
+        if row:
+            invalidate_regelverk(row["regelverkid"], row["kategoriid"])
+    return bulk_response(results, "regelverkid", "created")
+
+
+@router.put("/regelverker/bulk/update", response_model=BulkResponse)
+async def update_regelverk_bulk(regelverker: List[BulkUpdateRegelverk]):
+    query = """
+    UPDATE regelverker r
+    SET betingelse = v.betingelse, verdi = v.verdi, tillatthandbagasje = v.tillatthandbagasje,
+        tillattinnsjekketbagasje = v.tillattinnsjekketbagasje, beskrivelse = v.beskrivelse
+    FROM (VALUES %s) AS v(regelverkid, betingelse, verdi, tillatthandbagasje, tillattinnsjekketbagasje, beskrivelse)
+    WHERE r.regelverkid = v.regelverkid
+    RETURNING r.regelverkid, r.kategoriid;
+    """
+    rows = [
+        (r.regelverkid, r.betingelse, r.verdi, r.tillatthandbagasje, r.tillattinnsjekketbagasje, r.regelverkbeskrivelse)
+        for r in regelverker
+    ]
+    results = await run_bulk(query, rows, key=[(0, "regelverkid")])
+    for row, _ in results:
+        if row:
+            invalidate_regelverk(row["regelverkid"], row["kategoriid"])
+    return bulk_response(results, "regelverkid", "updated")
+
+
+@router.delete("/regelverker/bulk/delete", response_model=BulkResponse)
+async def delete_regelverk_bulk(regelverker: BulkDelete):
+    query = """
+    DELETE FROM regelverker r
+    USING (VALUES %s) AS v(regelverkid)
+    WHERE r.regelverkid = v.regelverkid
+    RETURNING r.regelverkid, r.kategoriid;
+    """
+    rows = [(regelverkid,) for regelverkid in regelverker.ids]
+    results = await run_bulk(query, rows, key=[(0, "regelverkid")])
+    for row, _ in results:
+        if row:
+            invalidate_regelverk(row["regelverkid"], row["kategoriid"], deleted=True)
+    return bulk_response(results, "regelverkid", "deleted")
 
 
 # FOR å holde styr på gjenstander - regelverktag - regelverk
@@ -631,29 +863,17 @@ async def create_regelverktag(regelverktag: CreateRegelverkTag):
     RETURNING regelverktagid, gjenstandid, regelverkid;
     """
     values = (regelverktag.gjenstandid, regelverktag.regelverkid)
-    conn = sql_module.create_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Failed to connect to database")
-
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(query, values)
-            conn.commit()
-            data = cursor.fetchone()
-            if data:
-                columns = [col[0] for col in cursor.description]
-                data_dict = dict(zip(columns, data))
-                return CreateRegelverkTag(**data_dict)
-            else:
-                raise HTTPException(status_code=404, detail="Failed to create regelverktag")
+        data = await sql_module.execute_async(query, values, fetch="one", commit=True)
     except Exception as e:
-        conn.rollback()
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
-    finally:
-        conn.close()
+    if not data:
+        raise HTTPException(status_code=404, detail="Failed to create regelverktag")
+    invalidate_regelverktag(data["gjenstandid"], data["regelverkid"])
+    return CreateRegelverkTag(**data)
 
 
-# Slette koblinger mellom gjenstande rog regelverk    // Sletter men for feilmeldinger
+# Slette koblinger mellom gjenstander og regelverk
 @router.delete("/regelverktag/delete", status_code=status.HTTP_200_OK)
 async def delete_regelverktag(regelverktag: DeleteRegelverkTag):
     query = """
@@ -661,20 +881,12 @@ async def delete_regelverktag(regelverktag: DeleteRegelverkTag):
     WHERE gjenstandid = %s AND regelverkid = %s;
     """
     values = (regelverktag.gjenstandid, regelverktag.regelverkid)
-    conn = sql_module.create_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Failed to connect to database")
-
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(query, values)
-            conn.commit()
-            return {"message": "RegelverkTag successfully deleted"}
+        await sql_module.execute_async(query, values, commit=True)
     except Exception as e:
-        conn.rollback()
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
-    finally:
-        conn.close()
+    invalidate_regelverktag(regelverktag.gjenstandid, regelverktag.regelverkid)
+    return {"message": "RegelverkTag successfully deleted"}
 
 
 # Sletter basert på gjenstandid alene.
@@ -685,23 +897,15 @@ async def delete_regelverktag_by_item(regelverktag: DeleteRegelverkTagByItem):
     WHERE gjenstandid = %s;
     """
     values = (regelverktag.gjenstandid,)
-    conn = sql_module.create_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Failed to connect to database")
-
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(query, values)
-            conn.commit()
-            return {"message": "RegelverkTag successfully deleted"}
+        await sql_module.execute_async(query, values, commit=True)
     except Exception as e:
-        conn.rollback()
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
-    finally:
-        conn.close()
+    invalidate_regelverktag(gjenstandid=regelverktag.gjenstandid)
+    return {"message": "RegelverkTag successfully deleted"}
 
 
-# Sletter basert på gjenstandid alene.
+# Sletter basert på regelverkid alene.
 @router.delete("/regelverktag/rule/delete", status_code=status.HTTP_200_OK)
 async def delete_regelverktag_by_rule(regelverktag: DeleteRegelverkTagByItem):
     query = """
@@ -709,53 +913,52 @@ async def delete_regelverktag_by_rule(regelverktag: DeleteRegelverkTagByItem):
     WHERE regelverkid = %s;
     """
     values = (regelverktag.gjenstandid,)
-    conn = sql_module.create_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Failed to connect to database")
-
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(query, values)
-            conn.commit()
-            return {"message": "RegelverkTag successfully deleted"}
+        await sql_module.execute_async(query, values, commit=True)
     except Exception as e:
-        conn.rollback()
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
-    finally:
-        conn.close()
+    invalidate_regelverktag(regelverkid=regelverktag.gjenstandid)
+    return {"message": "RegelverkTag successfully deleted"}
 
 
-# Henter regelverker basert på gjenstandid
-@router.get("/regelverker/read/{gjenstandid}", response_model=List[Regelverk])
-async def get_rules(gjenstandid: int = Path(..., description="The ID of the item to fetch rules for")):
+@router.post("/regelverktag/bulk/", status_code=status.HTTP_201_CREATED, response_model=BulkResponse)
+async def create_regelverktag_bulk(regelverktags: List[CreateRegelverkTag]):
     query = """
-    SELECT 
-        reg.regelverkid, 
-        reg.kategoriid,  
-        reg.betingelse, 
-        reg.verdi, 
-        reg.tillatthandbagasje, 
-        reg.tillattinnsjekketbagasje, 
-        COALESCE(reg.beskrivelse, '') AS regelverkbeskrivelse
-    FROM 
-        regelverker reg
-    INNER JOIN 
-        regelverktag rtag ON reg.regelverkid = rtag.regelverkid
-    WHERE 
-        rtag.gjenstandid = %s
-    ORDER BY 
-        reg.regelverkid;
+    INSERT INTO regelverktag (gjenstandid, regelverkid)
+    VALUES %s
+    RETURNING regelverktagid, gjenstandid, regelverkid;
     """
-    conn = sql_module.create_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Failed to connect to database")
+    rows = [(tag.gjenstandid, tag.regelverkid) for tag in regelverktags]
+    results = await run_bulk(query, rows)
+    for row, _ in results:
+        if row:
+            invalidate_regelverktag(row["gjenstandid"], row["regelverkid"])
+    return bulk_response(results, "regelverktagid", "created")
 
+
+@router.delete("/regelverktag/bulk/delete", response_model=BulkResponse)
+async def delete_regelverktag_bulk(regelverktags: List[DeleteRegelverkTag]):
+    query = """
+    DELETE FROM regelverktag t
+    USING (VALUES %s) AS v(gjenstandid, regelverkid)
+    WHERE t.gjenstandid = v.gjenstandid AND t.regelverkid = v.regelverkid
+    RETURNING t.gjenstandid, t.regelverkid;
+    """
+    rows = [(tag.gjenstandid, tag.regelverkid) for tag in regelverktags]
+    results = await run_bulk(query, rows, key=[(0, "gjenstandid"), (1, "regelverkid")])
+    for row, _ in results:
+        if row:
+            invalidate_regelverktag(row["gjenstandid"], row["regelverkid"])
+    return bulk_response(results, None, "deleted")
+
+
+# Henter regelverker basert på gjenstandid
+@router.get("/regelverker/read/{gjenstandid}", response_model=List[Regelverk])
+async def get_rules(gjenstandid: int = Path(..., description="The ID of the item to fetch rules for")):
     try:
-        data = sql_module.execute_query(conn, query, (gjenstandid,))
-        if data.empty:
-            raise HTTPException(status_code=404, detail="No rules found for this item")
-        return data.to_dict(orient='records')
+        data = await rule_index.rules_for_item(gjenstandid)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An SQL error occurred: {str(e)}")
-    finally:
-        conn.close()
+    if not data:
+        raise HTTPException(status_code=404, detail="No rules found for this item")
+    return data
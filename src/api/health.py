@@ -0,0 +1,63 @@
+# src/api/health.py
+from fastapi import APIRouter, Response, status
+
+import sql as sql_module
+from utils import metrics
+
+router = APIRouter()
+
+# Filled in by main.py: import and startup timings in seconds, and the warmup state
+startup_report = {"role": None, "import": {}, "startup": {}, "warmup": {}, "warmup_done": False, "warmup_error": None}
+
+
+# Liveness: the process is up and the event loop answers. Never touches the database.
+@router.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+
+# Readiness: the database answers and, on query workers, the model stack has been warmed up
+@router.get("/readyz")
+async def readyz(response: Response):
+    checks = {}
+    try:
+        await sql_module.fetch_one_async("SELECT 1;", as_dict=False)
+        checks["database"] = "ok"
+    except Exception as e:
+        checks["database"] = str(e)
+    if startup_report["role"] != "crud":
+        if startup_report["warmup_error"]:
+            checks["warmup"] = startup_report["warmup_error"]
+        else:
+            checks["warmup"] = "ok" if startup_report["warmup_done"] else "pending"
+    ready = all(value == "ok" for value in checks.values())
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {"status": "ready" if ready else "not ready", "checks": checks}
+
+
+@router.get("/stats/startup")
+async def get_startup_stats():
+    return startup_report
+
+
+# Prometheus scrape target. Every worker keeps its own numbers, scrape each one (or run a single worker)
+@router.get("/metrics")
+async def get_metrics():
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def pool_collector():
+    stats = sql_module.pool_stats()
+    families = [
+        ("smartpack_db_pool_connections", "gauge", "Pooled database connections by state",
+         [({"state": "in_use"}, stats["in_use"]), ({"state": "idle"}, stats.get("idle", 0))]),
+    ]
+    for key, help in [("waits", "Borrows that had to wait for a free connection"),
+                      ("timeouts", "Borrows that gave up waiting"),
+                      ("discarded", "Broken connections closed instead of reused")]:
+        families.append((f"smartpack_db_pool_{key}_total", "counter", help, [({}, stats[key])]))
+    return families
+
+
+metrics.collectors.append(pool_collector)
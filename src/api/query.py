@@ -0,0 +1,202 @@
+# src/api/query.py
+import asyncio
+import json
+import uuid
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from utils import bot_utils
+from utils.lexical_index import hybrid_search
+from utils.semantic_cache import answer_cache
+from utils.chat_history import chat_store
+from utils.prompt_builder import record_breakdown, prompt_stats
+from utils import rule_engine
+from utils.rule_index import rule_index
+from utils import metrics
+
+# Question answering (RAG) routes. Kept apart from CRUDdb so that CRUD-only workers
+# (python main.py --role crud) never import or initialize the model stack.
+router = APIRouter()
+
+# Conversations are kept per session, identified by this header or cookie
+SESSION_HEADER = "X-Session-Id"
+SESSION_COOKIE = "smartpack_session"
+
+
+@router.get("/stats/prompt")
+async def get_prompt_stats():
+    return prompt_stats()
+
+
+@router.get("/stats/rules")
+async def get_rule_engine_stats():
+    return {**rule_engine.rule_stats(), "index": rule_index.stats}
+
+
+def rule_engine_collector():
+    stats = rule_engine.rule_stats()
+    return [("smartpack_rule_engine_questions_total", "counter", "Questions checked by the rule engine, by outcome",
+             [({"outcome": key}, stats[key]) for key in ["answered", "fallback", "errors"]])]
+
+
+metrics.collectors.append(rule_engine_collector)
+
+
+@router.get("/stats/chat")
+async def get_chat_stats():
+    return await run_in_threadpool(chat_store.stats)
+
+
+# Embedding, the Chroma search and the sqlite chat history are blocking, so they run in the threadpool
+async def embed_question(query):
+    return await run_in_threadpool(bot_utils.embed_query, query)
+
+
+# Exact item names are answered from the lexical index, other questions fuse it with the Chroma search
+async def retrieve(query, embedding):
+    return await run_in_threadpool(
+        hybrid_search,
+        query,
+        embedding,
+        n_results=5  # returns 5 results, change this if you want more or less
+    )
+
+
+# Returns the caller's session id, or a new one if the request carries none
+def get_session_id(request):
+    session_id = request.headers.get(SESSION_HEADER) or request.cookies.get(SESSION_COOKIE)
+    if session_id:
+        return session_id[:128], False
+    return uuid.uuid4().hex, True
+
+
+def attach_session(response, session_id, is_new):
+    response.headers[SESSION_HEADER] = session_id
+    if is_new:
+        response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite="lax")
+
+
+def llm_error(e):
+    if isinstance(e, asyncio.TimeoutError):
+        return HTTPException(status_code=504, detail="The language model did not answer in time")
+    return HTTPException(status_code=502, detail=f"The language model request failed: {str(e)}")
+
+
+@router.get("/query/{query}")
+async def query(query: str, request: Request, response: Response):
+    session_id, is_new = get_session_id(request)
+    attach_session(response, session_id, is_new)
+    stage = metrics.query_stage_duration.time
+    with stage("embedding"):
+        embedding = await embed_question(query)
+    history = await run_in_threadpool(chat_store.get, session_id)
+    # Near-duplicate questions reuse an earlier answer, the cache is cleared on every rule change.
+    # Only for the first question of a session: later answers depend on the conversation, not just the question.
+    cached = None
+    if not history:
+        with stage("cache_lookup"):
+            cached = answer_cache.lookup(embedding)
+    if cached is not None:
+        answer = cached[0]
+        await run_in_threadpool(chat_store.append, session_id, query, answer)
+        metrics.query_answers.inc("cache")
+        return {"response": answer}
+
+    with stage("retrieval"):
+        results = await retrieve(query, embedding)
+    # Questions about a single item are answered straight from its rules, without the model
+    with stage("rule_engine"):
+        answer = await rule_engine.answer(query, results)
+    if answer is not None:
+        await run_in_threadpool(chat_store.append, session_id, query, answer)
+        metrics.query_answers.inc("rules")
+        return {"response": answer}
+
+    generation = answer_cache.generation
+    with stage("format"):
+        context_chunks = bot_utils.format_compact(results)
+    with stage("prompt"):
+        messages, breakdown = bot_utils.build_messages(query, context_chunks, history)
+    try:
+        openai_result = await bot_utils.openai_completion_async(messages)
+    except Exception as e:
+        raise llm_error(e)
+    metrics.query_answers.inc("llm")
+    if openai_result.usage is not None:
+        breakdown["llm_prompt_tokens"] = openai_result.usage.prompt_tokens
+        breakdown["llm_completion_tokens"] = openai_result.usage.completion_tokens
+    record_breakdown(breakdown)
+    answer = openai_result.choices[0].message.content
+    await run_in_threadpool(chat_store.append, session_id, query, answer)
+    if not history:
+        answer_cache.store(query, embedding, answer, generation)
+
+    return {"response": answer}
+
+
+def sse_event(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+# Same as /query, but the answer is sent as server-sent events while the model writes it.
+# Each event carries {"token": ...}, a final "done" event carries the full answer.
+@router.get("/query/stream/{query}")
+async def query_stream(query: str, request: Request):
+    session_id, is_new = get_session_id(request)
+    stage = metrics.query_stage_duration.time
+    with stage("embedding"):
+        embedding = await embed_question(query)
+    history = await run_in_threadpool(chat_store.get, session_id)
+    cached = None
+    if not history:
+        with stage("cache_lookup"):
+            cached = answer_cache.lookup(embedding)
+    answer = cached[0] if cached is not None else None
+    source = "cache"
+    if answer is None:
+        with stage("retrieval"):
+            results = await retrieve(query, embedding)
+        with stage("rule_engine"):
+            answer = await rule_engine.answer(query, results)
+        source = "rules"
+    if answer is not None:
+        await run_in_threadpool(chat_store.append, session_id, query, answer)
+        metrics.query_answers.inc(source)
+        events = iter([sse_event({"token": answer}), sse_event({"response": answer}, "done")])
+    else:
+        generation = answer_cache.generation
+        with stage("format"):
+            context_chunks = bot_utils.format_compact(results)
+        with stage("prompt"):
+            messages, breakdown = bot_utils.build_messages(query, context_chunks, history)
+        metrics.query_answers.inc("llm")
+
+        async def events():
+            parts = []
+            usage = {}
+            try:
+                async for token in bot_utils.openai_completion_stream_async(messages, usage):
+                    parts.append(token)
+                    yield sse_event({"token": token})
+            except Exception as e:
+                yield sse_event({"detail": llm_error(e).detail}, "error")
+                return
+            finally:
+                # Usage arrives with the last chunk, so the breakdown is recorded once the stream has ended
+                if usage:
+                    breakdown["llm_prompt_tokens"] = usage["prompt_tokens"]
+                    breakdown["llm_completion_tokens"] = usage["completion_tokens"]
+                record_breakdown(breakdown)
+            answer = "".join(parts)
+            # Recorded only once the whole answer has been streamed
+            await run_in_threadpool(chat_store.append, session_id, query, answer)
+            if not history:
+                answer_cache.store(query, embedding, answer, generation)
+            yield sse_event({"response": answer}, "done")
+
+        events = events()
+    response = StreamingResponse(events, media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    attach_session(response, session_id, is_new)
+    return response
@@ -7,6 +7,8 @@ import sys
 if __name__ == "__main__":
     query = sys.argv[1] if len(sys.argv) > 1 else None
     url = "http://127.0.0.1:8000/query/"
+    # Keeps the session cookie, so the server remembers this conversation
+    session = requests.Session()
 
     while True:
         user_input = input("Prompt: ") if not query else query
@@ -15,7 +17,7 @@ if __name__ == "__main__":
 
 
         # Sending a POST request with the JSON payload
-        response = requests.get(f"{url}{user_input}")
+        response = session.get(f"{url}{user_input}")
 
         if response.status_code == 200:
             # Parse the JSON response and then pretty-print it
@@ -1,22 +1,143 @@
 # src/main.py
+import time
+
+_import_start = time.perf_counter()
+
+import argparse
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.cors import CORSMiddleware
 from api.CRUDdb import router as crud_router  # Import CRUD router
+from api.health import router as health_router, startup_report
+import sql as sql_module
+import utils.constants as cs
+from utils.index_sync import index_sync
+from utils.rule_index import rule_index
+from utils.invalidation_bus import invalidation_bus
+from utils import bot_utils
+from utils.metrics import MetricsMiddleware
+
+startup_report["import"]["core"] = round(time.perf_counter() - _import_start, 3)
+
+# "all" serves CRUD and questions, "crud" leaves out the query routes and never loads the model stack
+ROLE = os.environ.get("SMARTPACK_ROLE", getattr(cs, "server_role", "all"))
+# Load Chroma, the embedding model and the OpenAI clients in the background right after startup
+WARMUP = getattr(cs, "warmup_on_startup", True)
+
+
+async def warmup():
+    try:
+        startup_report["warmup"] = await run_in_threadpool(bot_utils.warmup)
+        startup_report["warmup_done"] = True
+    except Exception as e:
+        startup_report["warmup_error"] = str(e)
+        print(f"Warmup failed, the model stack is loaded on the first question instead: {e}")
+
+
+async def timed(name, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    if asyncio.iscoroutine(result):
+        result = await result
+    startup_report["startup"][name] = round(time.perf_counter() - start, 3)
+    return result
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    role = app.state.role
+    # Open the database pool before serving and drain it on shutdown
+    await timed("db_pool", sql_module.init_pool)
+    # Item/rule lookups are served from memory, see utils/rule_index.py
+    await timed("rule_index", sql_module.run_async, rule_index.load)
+    # CRUD-only workers leave re-embedding to the query workers, see CRUDdb.invalidate_*
+    if role != "crud":
+        await timed("index_sync", index_sync.start)
+    # Keeps the caches of this worker in step with writes handled by the others
+    await timed("invalidation_bus", invalidation_bus.start)
+    warmup_task = None
+    if role != "crud":
+        if WARMUP:
+            # Not awaited: /healthz answers at once, /readyz waits for the warmup
+            warmup_task = asyncio.create_task(warmup())
+        else:
+            startup_report["warmup_done"] = True
+    print(f"Startup ({role}): {startup_report['import']} imports, {startup_report['startup']}")
+    try:
+        yield
+    finally:
+        if warmup_task is not None and not warmup_task.done():
+            warmup_task.cancel()
+        # Flush queued index updates and notifications while the database is still reachable
+        invalidation_bus.stop()
+        index_sync.stop()
+        sql_module.close_pool()
+        await bot_utils.close()
+
+
+def create_app(role=ROLE):
+    app = FastAPI(lifespan=lifespan)
+    app.state.role = role
+    startup_report["role"] = role
+
+    # Set up CORS middleware configuration
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # List of allowed origins (you can use ["*"] for all)
+        allow_credentials=True,
+        allow_methods=["*"],  # Allows all methods
+        allow_headers=["*"],  # Allows all headers
+        expose_headers=["X-Next-Cursor", "ETag", "X-Session-Id"],  # Lets browser clients read these response headers
+    )
+    # Request counts, latency per route and requests in flight for /metrics
+    app.add_middleware(MetricsMiddleware)
+
+    # Include the routers, the query routes only on workers that answer questions
+    app.include_router(health_router)
+    app.include_router(crud_router)
+    if role != "crud":
+        start = time.perf_counter()
+        from api.query import router as query_router
+        startup_report["import"]["query"] = round(time.perf_counter() - start, 3)
+        app.include_router(query_router)
+    return app
+
+
+app = create_app()
 
-app = FastAPI()
 
-# Set up CORS middleware configuration
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # List of allowed origins (you can use ["*"] for all)
-    allow_credentials=True,
-    allow_methods=["*"],  # Allows all methods
-    allow_headers=["*"],  # Allows all headers
-)
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the Smartpack API")
+    parser.add_argument("--host", default=getattr(cs, "server_host", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=getattr(cs, "server_port", 8000))
+    parser.add_argument("--workers", type=int, default=getattr(cs, "server_workers", 1),
+                        help="Worker processes, use more than one to serve on several cores")
+    parser.add_argument("--role", choices=["all", "crud"], default=ROLE,
+                        help="crud serves only the database routes and never loads the model stack")
+    return parser.parse_args()
 
-# Include the CRUD router
-app.include_router(crud_router)
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="127.0.0.1", port=8000, log_level="info")
+    args = parse_args()
+    # Workers spawned by uvicorn read the role from the environment
+    os.environ["SMARTPACK_ROLE"] = args.role
+    if args.workers > 1:
+        # The local ./chroma store must not be opened by several processes, and a worker would never see
+        # the documents another worker re-embeds. Query workers therefore share a Chroma server.
+        if args.role != "crud" and not bot_utils.CHROMA_HOST:
+            raise SystemExit("--workers > 1 needs a Chroma server: set SMARTPACK_CHROMA_HOST (or chroma_host in "
+                             "utils/constants.py), or start with --role crud")
+        # Chat history must be visible to every worker, the in-memory store is per process.
+        # Set before the workers are spawned, they inherit the environment.
+        os.environ.setdefault("SMARTPACK_CHAT_HISTORY_BACKEND", "sqlite")
+        # Workers import the app themselves, so it has to be passed as an import string
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers, log_level="info")
+    else:
+        if args.role != ROLE:
+            app = create_app(args.role)
+        uvicorn.run(app, host=args.host, port=args.port, log_level="info")
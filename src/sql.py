@@ -1,6 +1,54 @@
+import asyncio
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
 import psycopg2
+from psycopg2 import pool as pg_pool
+from psycopg2 import extensions as pg_extensions
+from psycopg2.extras import execute_values
 from utils import constants as cs
-import pandas as pd
+from utils import metrics
+
+# Pool settings, can be overridden in utils/constants.py
+POOL_MIN_SIZE = getattr(cs, "db_pool_min_size", 2)
+POOL_MAX_SIZE = getattr(cs, "db_pool_max_size", 10)
+# Seconds to wait for a free connection before giving up
+POOL_TIMEOUT = getattr(cs, "db_pool_timeout", 10.0)
+# Connections idle longer than this are pinged before they are handed out
+HEALTH_CHECK_INTERVAL = getattr(cs, "db_health_check_interval", 30.0)
+# Rows per multi-row VALUES statement in execute_bulk
+BULK_PAGE_SIZE = getattr(cs, "db_bulk_page_size", 500)
+# Rows fetched per round trip when streaming through a server-side cursor
+STREAM_BATCH_SIZE = getattr(cs, "db_stream_batch_size", 500)
+# Streams open at the same time. Each one holds a connection until the client has read everything,
+# so they are capped below the pool size to leave connections for the other requests
+STREAM_MAX_CONCURRENT = getattr(cs, "db_stream_max_concurrent", max(1, POOL_MAX_SIZE // 2))
+
+_pool = None
+_pool_slots = None
+_executor = None
+_stream_slots = None
+_pool_lock = threading.Lock()
+# Counters are updated from every executor thread, += on a dict entry is not atomic
+_stats_lock = threading.Lock()
+_last_used = {}
+_stats = {
+    "borrowed": 0,
+    "returned": 0,
+    "in_use": 0,
+    "waits": 0,
+    "timeouts": 0,
+    "health_checks": 0,
+    "discarded": 0,
+}
+
+
+def _bump(name):
+    with _stats_lock:
+        _stats[name] += 1
 
 
 def create_connection():
@@ -12,13 +60,333 @@ def create_connection():
     )
     return conn
 
-def execute_query(conn, query):
-    df = pd.read_sql_query(query, conn)
+
+def init_pool(min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE):
+    global _pool, _pool_slots
+    with _pool_lock:
+        if _pool is not None:
+            return _pool
+        _pool = pg_pool.ThreadedConnectionPool(
+            min_size,
+            max_size,
+            dbname=cs.dbname,
+            user=cs.user,
+            password=cs.password,
+            host=cs.host
+        )
+        # ThreadedConnectionPool raises when exhausted, the semaphore makes callers wait instead
+        _pool_slots = threading.BoundedSemaphore(max_size)
+        with _stats_lock:
+            _stats["min_size"] = min_size
+            _stats["max_size"] = max_size
+        _get_executor()
+        print(f"Database pool created (min={min_size}, max={max_size})")
+        return _pool
+
+
+def close_pool():
+    global _pool, _pool_slots, _executor
+    with _pool_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+        if _pool is None:
+            return
+        _pool.closeall()
+        _pool = None
+        _pool_slots = None
+        _last_used.clear()
+        print("Database pool closed")
+
+
+def pool_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["initialized"] = _pool is not None
+    if _pool is not None:
+        stats["idle"] = len(_pool._pool)
+        stats["open"] = len(_pool._pool) + len(_pool._used)
+    return stats
+
+
+def _is_healthy(conn):
+    if conn.closed:
+        return False
+    if time.monotonic() - _last_used.get(id(conn), 0) < HEALTH_CHECK_INTERVAL:
+        return True
+    _bump("health_checks")
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def acquire():
+    start = time.perf_counter()
+    if _pool is None:
+        init_pool()
+    slots = _pool_slots
+    if not slots.acquire(blocking=False):
+        _bump("waits")
+        if not slots.acquire(timeout=POOL_TIMEOUT):
+            _bump("timeouts")
+            raise pg_pool.PoolError("Timed out waiting for a database connection")
+    try:
+        conn = _pool.getconn()
+        if not _is_healthy(conn):
+            _bump("discarded")
+            _last_used.pop(id(conn), None)
+            _pool.putconn(conn, close=True)
+            conn = _pool.getconn()
+    except Exception:
+        slots.release()
+        raise
+    with _stats_lock:
+        _stats["borrowed"] += 1
+        _stats["in_use"] += 1
+    metrics.db_duration.observe(time.perf_counter() - start, "acquire")
+    return conn
+
+
+def release(conn, discard=False):
+    if _pool is None:
+        conn.close()
+        return
+    if not discard and not conn.closed:
+        # Never hand out a connection with an open or failed transaction
+        if conn.get_transaction_status() != pg_extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                discard = True
+    discard = discard or bool(conn.closed)
+    if discard:
+        _bump("discarded")
+        _last_used.pop(id(conn), None)
+    else:
+        _last_used[id(conn)] = time.monotonic()
+    _pool.putconn(conn, close=discard)
+    with _stats_lock:
+        _stats["returned"] += 1
+        _stats["in_use"] -= 1
+    _pool_slots.release()
+
+
+@contextmanager
+def get_connection():
+    conn = acquire()
+    try:
+        yield conn
+    except psycopg2.OperationalError:
+        release(conn, discard=True)
+        raise
+    except BaseException:
+        release(conn)
+        raise
+    else:
+        release(conn)
+
+
+# Returns a DataFrame, only meant for analytical callers. Request handlers should use fetch_rows/fetch_one
+def execute_query(conn, query, params=None):
+    import pandas as pd
+    df = pd.read_sql_query(query, conn, params=params)
     print("Query executed successfully")
     return df
 
 
+def _map_rows(cursor, rows, as_dict):
+    if not as_dict:
+        return rows
+    columns = [desc[0] for desc in cursor.description]
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def _execute_timed(cur, query, params):
+    start = time.perf_counter()
+    if params is None:
+        cur.execute(query)
+    else:
+        cur.execute(query, params)
+    end = time.perf_counter()
+    metrics.db_duration.observe(end - start, "execute")
+    return end
+
+
+# Fast path: rows straight from the cursor as dicts (or tuples with as_dict=False)
+def fetch_rows(conn, query, params=None, as_dict=True):
+    cur = conn.cursor()
+    try:
+        start = _execute_timed(cur, query, params)
+        rows = _map_rows(cur, cur.fetchall(), as_dict)
+        metrics.db_duration.observe(time.perf_counter() - start, "fetch")
+        return rows
+    finally:
+        cur.close()
+
+
+def fetch_one(conn, query, params=None, as_dict=True):
+    cur = conn.cursor()
+    try:
+        start = _execute_timed(cur, query, params)
+        row = cur.fetchone()
+        if row is not None:
+            row = _map_rows(cur, [row], as_dict)[0]
+        metrics.db_duration.observe(time.perf_counter() - start, "fetch")
+        return row
+    finally:
+        cur.close()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # One thread per pooled connection. Streams keep a connection borrowed between their fetches
+        # without holding a thread, stream_rows caps them with STREAM_MAX_CONCURRENT
+        _executor = ThreadPoolExecutor(max_workers=POOL_MAX_SIZE, thread_name_prefix="db")
+    return _executor
+
+
+def _run_with_connection(func, args, submitted):
+    # Time spent waiting for a free executor thread
+    metrics.db_duration.observe(time.perf_counter() - submitted, "queue")
+    with get_connection() as conn:
+        return func(conn, *args)
+
+
+# Runs func(conn, *args) on the database executor with a pooled connection,
+# keeping blocking psycopg2 calls off the event loop
+async def run_async(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), _run_with_connection, func, args, time.perf_counter())
+
+
+def execute(conn, query, params=None, fetch=None, commit=False):
+    try:
+        with conn.cursor() as cur:
+            start = time.perf_counter()
+            cur.execute(query, params)
+            if fetch == "one":
+                row = cur.fetchone()
+                result = None if row is None else _map_rows(cur, [row], True)[0]
+            elif fetch == "all":
+                result = _map_rows(cur, cur.fetchall(), True)
+            else:
+                result = cur.rowcount
+        if commit:
+            conn.commit()
+        # Writes are timed as one statement including the commit
+        metrics.db_duration.observe(time.perf_counter() - start, "execute")
+        return result
+    except Exception:
+        conn.rollback()
+        raise
+
+
+async def execute_async(query, params=None, fetch=None, commit=False):
+    return await run_async(execute, query, params, fetch, commit)
+
+
+async def fetch_rows_async(query, params=None, as_dict=True):
+    return await run_async(fetch_rows, query, params, as_dict)
+
+
+async def fetch_one_async(query, params=None, as_dict=True):
+    return await run_async(fetch_one, query, params, as_dict)
+
+
+# Yields rows as dicts from a server-side (named) cursor, so only one batch is held in memory.
+# The pooled connection stays borrowed until the generator is exhausted or closed.
+# Callers past STREAM_MAX_CONCURRENT wait here for another stream to finish.
+async def stream_rows(query, params=None, batch_size=STREAM_BATCH_SIZE):
+    global _stream_slots
+    if _stream_slots is None:
+        _stream_slots = asyncio.Semaphore(STREAM_MAX_CONCURRENT)
+    slots = _stream_slots
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    await slots.acquire()
+    try:
+        conn = await loop.run_in_executor(executor, acquire)
+    except BaseException:
+        slots.release()
+        raise
+    cur = None
+    try:
+        cur = conn.cursor(name=f"stream_{uuid.uuid4().hex}")
+        cur.itersize = batch_size
+        await loop.run_in_executor(executor, _execute_timed, cur, query, params)
+        columns = None
+        while True:
+            rows = await loop.run_in_executor(executor, cur.fetchmany, batch_size)
+            if not rows:
+                break
+            if columns is None:
+                columns = [desc[0] for desc in cur.description]
+            for row in rows:
+                yield dict(zip(columns, row))
+    finally:
+        if cur is not None and not cur.closed:
+            await loop.run_in_executor(executor, _close_quietly, cur)
+        try:
+            await loop.run_in_executor(executor, release, conn)
+        finally:
+            slots.release()
+
+
+def _close_quietly(cur):
+    try:
+        cur.close()
+    except psycopg2.Error:
+        pass
+
+
+# Runs a "... VALUES %s ... RETURNING" statement for many rows in one transaction and returns one
+# (row, error) pair per input row. key lists (input position, returned column) pairs used to match
+# RETURNING rows to input rows; without it rows are matched by position (plain INSERTs).
+# If the multi-row statement fails, it is retried row by row under savepoints so that only
+# the offending rows fail and the rest are still committed.
+def execute_bulk(conn, query, rows, key=None, template=None):
+    if not rows:
+        return []
+    start = time.perf_counter()
 
+    def match(returned, batch):
+        if key is None:
+            return [(row, None) for row in returned]
+        by_key = {tuple(row[column] for _, column in key): row for row in returned}
+        return [(by_key.get(tuple(values[position] for position, _ in key)), None) for values in batch]
 
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SAVEPOINT bulk")
+            try:
+                returned = execute_values(cur, query, rows, template=template,
+                                          page_size=BULK_PAGE_SIZE, fetch=True)
+                results = match(_map_rows(cur, returned, True), rows)
+            except psycopg2.Error:
+                cur.execute("ROLLBACK TO SAVEPOINT bulk")
+                results = []
+                for values in rows:
+                    cur.execute("SAVEPOINT bulk_row")
+                    try:
+                        returned = execute_values(cur, query, [values], template=template, fetch=True)
+                        result = match(_map_rows(cur, returned, True), [values])
+                        results.append(result[0] if result else (None, None))
+                        cur.execute("RELEASE SAVEPOINT bulk_row")
+                    except psycopg2.Error as e:
+                        cur.execute("ROLLBACK TO SAVEPOINT bulk_row")
+                        results.append((None, str(e).strip()))
+        conn.commit()
+        metrics.db_duration.observe(time.perf_counter() - start, "execute")
+        return results
+    except Exception:
+        conn.rollback()
+        raise
 
 
+async def execute_bulk_async(query, rows, key=None, template=None):
+    return await run_async(execute_bulk, query, rows, key, template)
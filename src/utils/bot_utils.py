@@ -1,8 +1,19 @@
 # src/bot_utils.py
+import asyncio
 import csv
-from openai import OpenAI
-import chromadb
+import hashlib
+import os
+import random
+import threading
+import time
 import utils.constants as cs
+from utils import metrics, prompt_builder
+from utils.embedding_cache import embedding_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows, where only a single worker is supported
+    fcntl = None
 
 
 instructions = [
@@ -18,6 +29,29 @@ instructions = [
 
 instructions_str = " ".join(instructions)
 
+CSV_FILE = '../data/c.csv'
+# Deadline in seconds for one completion, including queueing for a slot and all retries
+LLM_DEADLINE = getattr(cs, "llm_deadline", 30.0)
+LLM_MAX_RETRIES = getattr(cs, "llm_max_retries", 2)
+LLM_BACKOFF_BASE = getattr(cs, "llm_backoff_base", 0.5)
+LLM_BACKOFF_MAX = getattr(cs, "llm_backoff_max", 4.0)
+# Completions in flight at once per worker, also the size of the HTTP connection pool
+LLM_MAX_CONCURRENCY = getattr(cs, "llm_max_concurrency", 16)
+# Rows per collection.upsert/delete call when syncing the CSV into Chroma
+INGEST_BATCH_SIZE = getattr(cs, "chroma_batch_size", 64)
+# Bookkeeping metadata used for incremental sync, never shown to the model
+INTERNAL_METADATA = {"row_hash", "gjenstandid", "kategoriid", "regelverkid", "source"}
+# Chroma server shared by all workers, e.g. "localhost". Without it every worker opens the local ./chroma store
+CHROMA_HOST = os.environ.get("SMARTPACK_CHROMA_HOST", getattr(cs, "chroma_host", None))
+CHROMA_PORT = int(os.environ.get("SMARTPACK_CHROMA_PORT", getattr(cs, "chroma_port", 8000)))
+# Held while seeding Chroma from the CSV, so that only one of several workers does it
+SEED_LOCK_FILE = getattr(cs, "chroma_seed_lock", "chroma_seed.lock")
+CSV_FIELDS = [
+    "gjenstandid", "gjenstandnavn", "gjenstandkategoriid", "gjenstandbeskrivelse", "kategorinavn",
+    "kategoribeskrivelse", "regelverkid", "betingelse", "verdi", "tillatthandbagasje",
+    "tillattinnsjekketbagasje", "regelverkbeskrivelse"
+]
+
 def log_results_to_csv(results, csv_file):
     with open(csv_file, mode='w', newline='') as file:
         writer = csv.writer(file)
@@ -26,19 +60,130 @@ def log_results_to_csv(results, csv_file):
             writer.writerow(result)
 
 
-def openai_completion(user_input, results, chat_history):
-    # Format chat history
-    history_str = "\n".join([f"User: {q}\nBot: {a}" for q, a in chat_history])
-    prompt = f"This is the question: {user_input}\nThis is the information you will need to answer the question:\n{results}\n\nChat history:\n{history_str}"
+# results is a list of context chunks in rank order (or one preformatted string).
+# Returns the messages and the token breakdown of the budgeted prompt.
+def build_messages(user_input, results, chat_history):
+    if isinstance(results, str):
+        results = [results]
+    prompt, breakdown = prompt_builder.build_prompt(user_input, results, chat_history)
+    messages = [
+        {"role": "system", "content": instructions_str},
+        {"role": "user", "content": prompt}
+    ]
+    return messages, breakdown
+
+
+_llm_slots = None
+
+
+def _get_llm_slots():
+    # Created lazily so it belongs to the running event loop
+    global _llm_slots
+    if _llm_slots is None:
+        _llm_slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _llm_slots
+
+
+def _remaining(deadline):
+    remaining = deadline - asyncio.get_running_loop().time()
+    if remaining <= 0:
+        raise asyncio.TimeoutError()
+    return remaining
+
+
+# Calls make_call() until it succeeds, retrying transient errors with jittered exponential
+# backoff as long as the retry budget and the deadline allow it
+async def _call_with_retries(make_call, deadline):
+    attempt = 0
+    while True:
+        try:
+            return await asyncio.wait_for(make_call(), _remaining(deadline))
+        except _retryable_errors():
+            attempt += 1
+            delay = min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+            if attempt > LLM_MAX_RETRIES or asyncio.get_running_loop().time() + delay >= deadline:
+                raise
+            await asyncio.sleep(delay)
+
+
+def _llm_outcome(e):
+    return "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+
 
-    completion = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": instructions_str},
-            {"role": "user", "content": prompt}
-        ]
-    )
-    return completion, user_input
+async def openai_completion_async(messages):
+    start = time.perf_counter()
+    deadline = asyncio.get_running_loop().time() + LLM_DEADLINE
+    slots = _get_llm_slots()
+    try:
+        await asyncio.wait_for(slots.acquire(), _remaining(deadline))
+        try:
+            completion = await _call_with_retries(
+                lambda: get_async_client().chat.completions.create(model="gpt-4o", messages=messages), deadline)
+        finally:
+            slots.release()
+    except Exception as e:
+        metrics.llm_requests.inc(_llm_outcome(e))
+        raise
+    metrics.llm_duration.observe(time.perf_counter() - start, "completion")
+    metrics.llm_requests.inc("ok")
+    if completion.usage is not None:
+        metrics.llm_tokens.inc("prompt", amount=completion.usage.prompt_tokens)
+        metrics.llm_tokens.inc("completion", amount=completion.usage.completion_tokens)
+    return completion
+
+
+# Yields the answer text piece by piece as the model produces it. Only opening the stream is retried,
+# once tokens have been yielded a failure is raised to the caller.
+# If a dict is passed as usage, it gets prompt_tokens and completion_tokens once the stream has ended.
+async def openai_completion_stream_async(messages, usage=None):
+    start = time.perf_counter()
+    deadline = asyncio.get_running_loop().time() + LLM_DEADLINE
+    slots = _get_llm_slots()
+    try:
+        await asyncio.wait_for(slots.acquire(), _remaining(deadline))
+    except Exception as e:
+        metrics.llm_requests.inc(_llm_outcome(e))
+        raise
+    stream = None
+    first_token = True
+    try:
+        stream = await _call_with_retries(
+            lambda: get_async_client().chat.completions.create(
+                model="gpt-4o", messages=messages, stream=True,
+                # The last chunk then carries the token usage, like the non-streamed completion
+                stream_options={"include_usage": True}), deadline)
+        chunks = stream.__aiter__()
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), _remaining(deadline))
+            except StopAsyncIteration:
+                break
+            if chunk.choices and chunk.choices[0].delta.content:
+                if first_token:
+                    metrics.llm_duration.observe(time.perf_counter() - start, "first_token")
+                    first_token = False
+                yield chunk.choices[0].delta.content
+            if getattr(chunk, "usage", None) is not None:
+                metrics.llm_tokens.inc("prompt", amount=chunk.usage.prompt_tokens)
+                metrics.llm_tokens.inc("completion", amount=chunk.usage.completion_tokens)
+                if usage is not None:
+                    usage["prompt_tokens"] = chunk.usage.prompt_tokens
+                    usage["completion_tokens"] = chunk.usage.completion_tokens
+        metrics.llm_duration.observe(time.perf_counter() - start, "stream")
+        metrics.llm_requests.inc("ok")
+    except Exception as e:
+        metrics.llm_requests.inc(_llm_outcome(e))
+        raise
+    finally:
+        slots.release()
+        if stream is not None:
+            # Hands the HTTP connection back to the pool even if the client went away mid-answer
+            await stream.close()
+
+
+# Embeds a question once, so the vector can be used both for the Chroma search and the answer cache
+def embed_query(text):
+    return get_embedding_function()([text])[0]
 
 
 def format_nicely(results):
@@ -51,52 +196,258 @@ def format_nicely(results):
         metadata = results['metadatas'][0][idx]
         formatted_result.append("Metadata:")
         for key, value in metadata.items():
-            formatted_result.append(f"  {key}: {value}")
+            if key not in INTERNAL_METADATA:
+                formatted_result.append(f"  {key}: {value}")
         formatted_results.append("\n".join(formatted_result))
     return formatted_results
 
 
-def add_csv_to_chroma(collection):
-    with open('../data/c.csv', newline='') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for id, row in enumerate(reader):
-            print(id + 1, row['gjenstandnavn'],
-                  row['gjenstandbeskrivelse'],
-                  row['kategorinavn'],
-                  row['kategoribeskrivelse'],
-                  row['betingelse'],
-                  row['verdi'],
-                  row['tillatthandbagasje'],
-                  row['tillattinnsjekketbagasje'],
-                  row['regelverkbeskrivelse'])
-
-            document = row['gjenstandnavn']
-            metadata = {
-                "gjenstandbeskrivelse": row['gjenstandbeskrivelse'],
-                "kategorinavn": row['kategorinavn'],
-                "kategoribeskrivelse": row['kategoribeskrivelse'],
-                "betingelse": row['betingelse'],
-                "verdi": row['verdi'],
-                "tillatthandbagasje": row['tillatthandbagasje'],
-                "tillattinnsjekketbagasje": row['tillattinnsjekketbagasje'],
-                "regelverkbeskrivelse": row['regelverkbeskrivelse']
-            }
-
-            collection.upsert(
-                documents=[document],
-                metadatas=[metadata],
-                ids=[f"id{id}"]
+def _yes_no(value):
+    return "ja" if str(value).strip().lower() == "true" else "nei"
+
+
+# Compact alternative to format_nicely: hits are grouped by category so shared descriptions are
+# written once, and ids/distances are dropped. Returns one chunk per category, ordered by the
+# rank of the category's best hit, so prompt_builder can still drop the least relevant ones.
+def format_compact(results):
+    # Imported here because rule_engine pulls in the database layer, which the benchmarks don't need
+    from utils.rule_engine import condition
+    groups = {}
+    seen_items = set()
+    seen_rules = set()
+    for idx, document in enumerate(results['documents'][0]):
+        metadata = results['metadatas'][0][idx]
+        category = metadata.get("kategorinavn", "")
+        lines = groups.get(category)
+        if lines is None:
+            header = f"Kategori: {category}"
+            if metadata.get("kategoribeskrivelse"):
+                header += f" - {metadata['kategoribeskrivelse']}"
+            lines = groups[category] = [header]
+
+        item = document
+        if document not in seen_items and metadata.get("gjenstandbeskrivelse"):
+            item = f"{document} ({metadata['gjenstandbeskrivelse']})"
+        seen_items.add(document)
+
+        # Same wording as the rule engine's answers: betingelse always, verdi only when it is a limit
+        lines.append(f"- {item} hvis {condition(metadata)}: håndbagasje {_yes_no(metadata.get('tillatthandbagasje'))}, "
+                     f"innsjekket {_yes_no(metadata.get('tillattinnsjekketbagasje'))}")
+
+        rule_text = str(metadata.get("regelverkbeskrivelse", "")).strip()
+        if rule_text and rule_text not in seen_rules:
+            seen_rules.add(rule_text)
+            lines.append(f"  Regel: {rule_text}")
+    return ["\n".join(lines) for lines in groups.values()]
+
+
+# One document per item/rule pair, so the id stays stable when rows are added or reordered
+def row_id(row):
+    return f"{row['gjenstandid']}-{row['regelverkid']}"
+
+
+def row_hash(row):
+    return hashlib.sha1("\x1f".join(str(row[field]) for field in CSV_FIELDS).encode()).hexdigest()
+
+
+def row_to_document(row):
+    document = row['gjenstandnavn']
+    metadata = {
+        "gjenstandbeskrivelse": row['gjenstandbeskrivelse'],
+        "kategorinavn": row['kategorinavn'],
+        "kategoribeskrivelse": row['kategoribeskrivelse'],
+        "betingelse": row['betingelse'],
+        "verdi": row['verdi'],
+        "tillatthandbagasje": row['tillatthandbagasje'],
+        "tillattinnsjekketbagasje": row['tillattinnsjekketbagasje'],
+        "regelverkbeskrivelse": row['regelverkbeskrivelse'],
+        "gjenstandid": int(row['gjenstandid']),
+        "kategoriid": int(row['gjenstandkategoriid']),
+        "regelverkid": int(row['regelverkid']),
+        "row_hash": row_hash(row)
+    }
+    return document, metadata
+
+
+# Documents are embedded here through the embedding cache, so rows whose metadata changed but whose
+# text did not (most rule edits) are not embedded again
+def upsert_batch(collection, batch):
+    if batch:
+        documents = [document for _, document, _ in batch]
+        embedding_function = get_embedding_function()
+        collection.upsert(
+            ids=[doc_id for doc_id, _, _ in batch],
+            documents=documents,
+            embeddings=embedding_cache.embed(type(embedding_function).__name__, documents, embedding_function),
+            metadatas=[metadata for _, _, metadata in batch]
+        )
+
+
+# Incremental sync: streams the CSV, re-embeds only new or changed rows (by content hash)
+# and removes vectors whose rows are gone from the file
+def sync_csv_to_chroma(collection, csv_file=CSV_FILE, batch_size=INGEST_BATCH_SIZE):
+    existing = collection.get(include=["metadatas"])
+    indexed = {}
+    for doc_id, metadata in zip(existing['ids'], existing['metadatas']):
+        metadata = metadata or {}
+        # Documents written by the CRUD index sync come from the database, which is newer than the CSV
+        if metadata.get("source") != "db":
+            indexed[doc_id] = metadata.get("row_hash")
+    db_owned = set(existing['ids']) - set(indexed)
+
+    stats = {"upserted": 0, "unchanged": 0, "deleted": 0}
+    seen = set()
+    batch = []
+    with open(csv_file, newline='') as csvfile:
+        for row in csv.DictReader(csvfile):
+            doc_id = row_id(row)
+            seen.add(doc_id)
+            if doc_id in db_owned:
+                stats["unchanged"] += 1
+                continue
+            document, metadata = row_to_document(row)
+            if indexed.get(doc_id) == metadata["row_hash"]:
+                stats["unchanged"] += 1
+                continue
+            batch.append((doc_id, document, metadata))
+            if len(batch) >= batch_size:
+                upsert_batch(collection, batch)
+                stats["upserted"] += len(batch)
+                batch = []
+    upsert_batch(collection, batch)
+    stats["upserted"] += len(batch)
+
+    removed = [doc_id for doc_id in indexed if doc_id not in seen]
+    for i in range(0, len(removed), batch_size):
+        collection.delete(ids=removed[i:i + batch_size])
+    stats["deleted"] = len(removed)
+
+    print(f"Chroma sync of {csv_file}: {stats['upserted']} upserted, "
+          f"{stats['unchanged']} unchanged, {stats['deleted']} deleted")
+    return stats
+
+
+def _file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+# Seeds the collection from the CSV once per CSV version. Workers starting together take turns on
+# the lock file; the first one syncs and records the CSV hash, the others find it and skip the sync.
+def seed_collection_once(collection, csv_file=CSV_FILE):
+    stamp_file = f"{SEED_LOCK_FILE}.done"
+    with open(SEED_LOCK_FILE, "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            csv_hash = _file_hash(csv_file)
+            if os.path.exists(stamp_file) and collection.count() > 0:
+                with open(stamp_file) as f:
+                    if f.read().strip() == csv_hash:
+                        print(f"Chroma already seeded from {csv_file}, skipping sync")
+                        return None
+            stats = sync_csv_to_chroma(collection, csv_file)
+            with open(stamp_file, "w") as f:
+                f.write(csv_hash)
+            return stats
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+# The OpenAI client, the Chroma store and the embedding model are created on first use (or by warmup),
+# so importing this module is cheap and CRUD-only workers never load them
+_init_lock = threading.RLock()
+_async_client = None
+_embedding_function = None
+_collection = None
+
+
+def _retryable_errors():
+    from openai import APIConnectionError, APITimeoutError, RateLimitError, InternalServerError
+    return APIConnectionError, APITimeoutError, RateLimitError, InternalServerError, asyncio.TimeoutError
+
+
+# Shared keep-alive connection pool for all async completions in this worker
+def get_async_client():
+    global _async_client
+    with _init_lock:
+        if _async_client is None:
+            import httpx
+            from openai import AsyncOpenAI
+            _async_client = AsyncOpenAI(
+                api_key=cs.main_key,
+                max_retries=0,  # retries are handled by _call_with_retries within the deadline
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(max_connections=LLM_MAX_CONCURRENCY,
+                                        max_keepalive_connections=LLM_MAX_CONCURRENCY),
+                    timeout=httpx.Timeout(LLM_DEADLINE, connect=5.0)
+                )
             )
-    return collection
+        return _async_client
+
+
+# Chroma's default model, passed explicitly so queries can be embedded outside collection.query
+def get_embedding_function():
+    global _embedding_function
+    with _init_lock:
+        if _embedding_function is None:
+            from chromadb.utils import embedding_functions
+            _embedding_function = embedding_functions.DefaultEmbeddingFunction()
+        return _embedding_function
+
+
+def get_collection():
+    global _collection
+    with _init_lock:
+        if _collection is None:
+            import chromadb
+            if CHROMA_HOST:
+                chroma_client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+            else:
+                chroma_client = chromadb.PersistentClient()
+            collection = chroma_client.get_or_create_collection(
+                name="item_collection",
+                embedding_function=get_embedding_function(),
+            )
+            seed_collection_once(collection)
+            _collection = collection
+        return _collection
+
+
+# Old attribute names (bot_utils.collection, bot_utils.async_client, ...) still work and initialize on access
+def __getattr__(name):
+    getters = {
+        "async_client": get_async_client,
+        "embedding_function": get_embedding_function,
+        "collection": get_collection,
+    }
+    if name in getters:
+        return getters[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
+def _warm_lexical_index():
+    from utils.lexical_index import lexical_index
+    lexical_index.search("warmup")
 
-client = OpenAI(api_key=cs.main_key)
 
-chroma_client = chromadb.PersistentClient()
+# Loads everything a question needs before the first request arrives. Returns seconds per step.
+def warmup():
+    timings = {}
+    for name, step in [
+        ("chroma", get_collection),
+        ("embedding_model", lambda: embed_query("warmup")),
+        ("lexical_index", _warm_lexical_index),
+        ("openai_client", get_async_client),
+        ("tokenizer", prompt_builder.get_encoding),
+    ]:
+        start = time.perf_counter()
+        step()
+        timings[name] = round(time.perf_counter() - start, 3)
+    return timings
 
-collection = chroma_client.get_or_create_collection(
-    name="item_collection",
-)
 
-if collection.count() == 0:
-    collection = add_csv_to_chroma(collection)
+async def close():
+    if _async_client is not None:
+        await _async_client.close()
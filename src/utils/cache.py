@@ -0,0 +1,125 @@
+# src/utils/cache.py
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import utils.constants as cs
+
+DEFAULT_MAXSIZE = getattr(cs, "cache_maxsize", 512)
+DEFAULT_TTL = getattr(cs, "cache_ttl", 300)
+
+# Every cache registers itself here so the stats endpoint can list them
+caches = {}
+
+_MISSING = object()
+
+
+class TTLCache:
+    """In-process LRU cache where entries also expire after ttl seconds."""
+
+    def __init__(self, name, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every invalidation, so a load that raced with a write is not stored
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        caches[name] = self
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, generation=None):
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    # Read-through: returns the cached value or awaits loader() and caches its result.
+    # Results for which should_cache(value) is false (e.g. empty lists) are returned but not stored.
+    async def get_or_load(self, key, loader, should_cache=bool):
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        generation = self._generation
+        value = await loader()
+        if should_cache(value):
+            self.set(key, value, generation)
+        return value
+
+    def invalidate(self, *keys):
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                if self._data.pop(key, _MISSING) is not _MISSING:
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+def all_stats():
+    return {name: cache.stats() for name, cache in caches.items()}
+
+
+class TableVersions:
+    """Per-table write counters used to build ETags without touching the database."""
+
+    def __init__(self):
+        # A new epoch per process, so counters restarting at 0 never reproduce an old ETag
+        self.epoch = uuid.uuid4().hex[:8]
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def bump(self, *tables):
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def get(self, table):
+        return self._versions.get(table, 0)
+
+    def etag(self, tables, key=""):
+        state = ",".join(f"{table}:{self.get(table)}" for table in tables)
+        digest = hashlib.sha1(f"{self.epoch}|{state}|{key}".encode()).hexdigest()[:20]
+        return f'"{digest}"'
+
+
+table_versions = TableVersions()
@@ -0,0 +1,137 @@
+# src/utils/chat_history.py
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+import utils.constants as cs
+
+# Question/answer pairs kept per session, older turns fall out of the prompt
+HISTORY_LENGTH = getattr(cs, "chat_history_length", 4)
+# Sessions without activity for this many seconds are dropped
+SESSION_IDLE_TIMEOUT = getattr(cs, "chat_session_idle_timeout", 1800)
+SWEEP_INTERVAL = 60
+# "memory" keeps history in this process, "sqlite" survives restarts and is shared by all workers on the host
+# main.py sets the environment variable to "sqlite" when it starts several workers
+BACKEND = os.environ.get("SMARTPACK_CHAT_HISTORY_BACKEND", getattr(cs, "chat_history_backend", "memory"))
+SQLITE_PATH = os.environ.get("SMARTPACK_CHAT_HISTORY_PATH", getattr(cs, "chat_history_path", "chat_history.sqlite3"))
+
+
+class InMemoryChatHistory:
+    def __init__(self, maxlen=HISTORY_LENGTH, idle_timeout=SESSION_IDLE_TIMEOUT):
+        self.maxlen = maxlen
+        self.idle_timeout = idle_timeout
+        self._sessions = {}  # session id -> (ring buffer of (question, answer), last seen)
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self.evicted = 0
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            return list(entry[0]) if entry else []
+
+    def append(self, session_id, question, answer):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            turns = entry[0] if entry else deque(maxlen=self.maxlen)
+            turns.append((question, answer))
+            self._sessions[session_id] = (turns, now)
+        if now - self._last_sweep > SWEEP_INTERVAL:
+            self.evict_idle()
+
+    def evict_idle(self):
+        now = time.monotonic()
+        with self._lock:
+            self._last_sweep = now
+            idle = [sid for sid, (_, seen) in self._sessions.items() if now - seen > self.idle_timeout]
+            for sid in idle:
+                del self._sessions[sid]
+            self.evicted += len(idle)
+        return len(idle)
+
+    def stats(self):
+        return {"backend": "memory", "sessions": len(self._sessions), "evicted": self.evicted}
+
+
+class SqliteChatHistory:
+    def __init__(self, path=SQLITE_PATH, maxlen=HISTORY_LENGTH, idle_timeout=SESSION_IDLE_TIMEOUT):
+        self.maxlen = maxlen
+        self.idle_timeout = idle_timeout
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+        self.evicted = 0
+        with self._lock:
+            # WAL lets several workers read and write the same file concurrently
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS chat_turns (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                question TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                created REAL NOT NULL
+            )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS chat_turns_session ON chat_turns (session_id, id)")
+
+    def get(self, session_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT question, answer FROM chat_turns WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                (session_id, self.maxlen)
+            ).fetchall()
+        return [(question, answer) for question, answer in reversed(rows)]
+
+    def append(self, session_id, question, answer):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO chat_turns (session_id, question, answer, created) VALUES (?, ?, ?, ?)",
+                    (session_id, question, answer, now)
+                )
+                # Ring buffer: keep only the newest maxlen turns of the session
+                self._conn.execute(
+                    """DELETE FROM chat_turns WHERE session_id = ? AND id NOT IN (
+                           SELECT id FROM chat_turns WHERE session_id = ? ORDER BY id DESC LIMIT ?)""",
+                    (session_id, session_id, self.maxlen)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if now - self._last_sweep > SWEEP_INTERVAL:
+            self.evict_idle()
+
+    def evict_idle(self):
+        now = time.time()
+        with self._lock:
+            self._last_sweep = now
+            cursor = self._conn.execute(
+                """DELETE FROM chat_turns WHERE session_id IN (
+                       SELECT session_id FROM chat_turns GROUP BY session_id HAVING MAX(created) < ?)""",
+                (now - self.idle_timeout,)
+            )
+            self.evicted += cursor.rowcount
+        return cursor.rowcount
+
+    def stats(self):
+        with self._lock:
+            sessions = self._conn.execute("SELECT COUNT(DISTINCT session_id) FROM chat_turns").fetchone()[0]
+        return {"backend": "sqlite", "sessions": sessions, "evicted_turns": self.evicted}
+
+
+def create_store(backend=BACKEND):
+    if backend == "sqlite":
+        return SqliteChatHistory()
+    if backend == "memory":
+        return InMemoryChatHistory()
+    raise ValueError(f"Unknown chat history backend: {backend}")
+
+
+chat_store = create_store()
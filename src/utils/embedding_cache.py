@@ -0,0 +1,93 @@
+# src/utils/embedding_cache.py
+import hashlib
+import json
+import sqlite3
+import threading
+
+import utils.constants as cs
+from utils.cache import caches
+
+# Set to False to embed every document again on each sync
+ENABLED = getattr(cs, "embedding_cache_enabled", True)
+# Shared by all workers on the host, like the sqlite chat history
+PATH = getattr(cs, "embedding_cache_path", "embedding_cache.sqlite3")
+# Keys per SELECT, sqlite allows at most 999 parameters in older builds
+LOOKUP_CHUNK = 500
+
+
+class EmbeddingCache:
+    """Document embeddings on disk keyed by model and text, so re-syncing only embeds changed text."""
+
+    def __init__(self, name, path=PATH):
+        self.name = name
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        caches[name] = self
+
+    # Opened on first use, so importing bot_utils stays cheap
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, embedding TEXT NOT NULL)")
+        return self._conn
+
+    @staticmethod
+    def key(model, text):
+        return hashlib.sha256(f"{model}\n{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model, texts):
+        keys = [self.key(model, text) for text in texts]
+        found = {}
+        with self._lock:
+            conn = self._connect()
+            for i in range(0, len(keys), LOOKUP_CHUNK):
+                chunk = keys[i:i + LOOKUP_CHUNK]
+                rows = conn.execute(
+                    f"SELECT key, embedding FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update((key, json.loads(embedding)) for key, embedding in rows)
+        return [found.get(key) for key in keys]
+
+    def set_many(self, model, texts, embeddings):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, embedding) VALUES (?, ?)",
+                    [(self.key(model, text), json.dumps([float(x) for x in embedding]))
+                     for text, embedding in zip(texts, embeddings)]
+                )
+
+    # Embeddings for texts in order, only the texts missing from the cache are passed to embed(texts)
+    def embed(self, model, texts, embed):
+        if not ENABLED:
+            return [list(embedding) for embedding in embed(texts)]
+        embeddings = self.get_many(model, texts)
+        missing = sorted({text for text, embedding in zip(texts, embeddings) if embedding is None})
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        if missing:
+            new = [list(embedding) for embedding in embed(missing)]
+            self.set_many(model, missing, new)
+            new = dict(zip(missing, new))
+            embeddings = [embedding if embedding is not None else new[text] for text, embedding in zip(texts, embeddings)]
+        return embeddings
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] if self._conn else 0
+            return {
+                "size": size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "path": self.path,
+            }
+
+
+embedding_cache = EmbeddingCache("embeddings")
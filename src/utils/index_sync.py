@@ -0,0 +1,189 @@
+# src/utils/index_sync.py
+import threading
+import time
+
+import sql as sql_module
+import utils.constants as cs
+from utils import bot_utils
+from utils.invalidation_bus import invalidation_bus
+from utils.lexical_index import lexical_index
+from utils.semantic_cache import answer_cache
+
+# Seconds to wait after the first queued change so that bursts of edits are coalesced into one batch
+DEBOUNCE_SECONDS = getattr(cs, "index_sync_debounce", 1.0)
+# Seconds before a failed batch is retried
+RETRY_SECONDS = getattr(cs, "index_sync_retry", 10.0)
+
+# Same shape as the rows in data/c.csv, so bot_utils.row_to_document can be reused
+ITEM_ROWS_QUERY = """
+SELECT
+    g.gjenstandid,
+    g.gjenstandnavn,
+    g.kategoriid AS gjenstandkategoriid,
+    COALESCE(g.beskrivelse, '') AS gjenstandbeskrivelse,
+    k.navn AS kategorinavn,
+    COALESCE(k.beskrivelse, '') AS kategoribeskrivelse,
+    r.regelverkid,
+    r.betingelse,
+    r.verdi,
+    r.tillatthandbagasje,
+    r.tillattinnsjekketbagasje,
+    COALESCE(r.beskrivelse, '') AS regelverkbeskrivelse
+FROM gjenstander g
+INNER JOIN kategorier k ON k.kategoriid = g.kategoriid
+INNER JOIN regelverktag rtag ON rtag.gjenstandid = g.gjenstandid
+INNER JOIN regelverker r ON r.regelverkid = rtag.regelverkid
+WHERE g.gjenstandid = ANY(%s);
+"""
+ITEMS_BY_RULE_QUERY = "SELECT DISTINCT gjenstandid FROM regelverktag WHERE regelverkid = ANY(%s);"
+ITEMS_BY_CATEGORY_QUERY = "SELECT gjenstandid FROM gjenstander WHERE kategoriid = ANY(%s);"
+
+
+class IndexSyncQueue:
+    """Background worker that re-embeds only the item documents affected by CRUD writes."""
+
+    def __init__(self, debounce=DEBOUNCE_SECONDS):
+        self.debounce = debounce
+        self._pending = {"gjenstand": set(), "regelverk": set(), "kategori": set()}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self.stats = {
+            "events": 0,
+            "batches": 0,
+            "items_reindexed": 0,
+            "documents_upserted": 0,
+            "documents_deleted": 0,
+            "errors": 0,
+        }
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    # kind is "gjenstand", "regelverk" or "kategori". Returns immediately, the work happens on the worker thread.
+    # Ignored when the worker was not started (CRUD-only workers), other workers re-embed for them.
+    def enqueue(self, kind, *ids):
+        ids = [i for i in ids if i is not None]
+        if not ids or not self.running:
+            return
+        with self._cond:
+            self._pending[kind].update(ids)
+            self.stats["events"] += 1
+            self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return sum(len(ids) for ids in self._pending.values())
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="index-sync", daemon=True)
+        self._thread.start()
+
+    # Flushes what is already queued before returning
+    def stop(self, timeout=30.0):
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _take_pending(self):
+        with self._cond:
+            while not self._stopping and not any(self._pending.values()):
+                self._cond.wait()
+            # Let a burst of edits pile up before processing. enqueue() notifies on every change,
+            # so keep waiting until the deadline instead of waking up on the next notify.
+            deadline = time.monotonic() + self.debounce
+            while not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            pending = self._pending
+            self._pending = {kind: set() for kind in pending}
+            return pending
+
+    def _run(self):
+        while True:
+            pending = self._take_pending()
+            if any(pending.values()):
+                try:
+                    self.sync(pending)
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    print(f"Index sync failed, retrying in {RETRY_SECONDS}s: {e}")
+                    with self._cond:
+                        for kind, ids in pending.items():
+                            self._pending[kind].update(ids)
+                        if not self._stopping:
+                            self._cond.wait(RETRY_SECONDS)
+                    if self._stopping:
+                        return
+                    continue
+            if self._stopping:
+                return
+
+    def sync(self, pending):
+        collection = bot_utils.get_collection()
+        item_ids = set(pending["gjenstand"])
+        with sql_module.get_connection() as conn:
+            if pending["regelverk"]:
+                rules = list(pending["regelverk"])
+                item_ids.update(row[0] for row in sql_module.fetch_rows(conn, ITEMS_BY_RULE_QUERY, (rules,), as_dict=False))
+                # Deleted rules or tags are gone from the database, the index still knows which items used them
+                item_ids.update(self._indexed_items(collection, "regelverkid", rules))
+            if pending["kategori"]:
+                categories = list(pending["kategori"])
+                item_ids.update(row[0] for row in sql_module.fetch_rows(conn, ITEMS_BY_CATEGORY_QUERY, (categories,), as_dict=False))
+                item_ids.update(self._indexed_items(collection, "kategoriid", categories))
+            if not item_ids:
+                return
+            rows = sql_module.fetch_rows(conn, ITEM_ROWS_QUERY, (list(item_ids),))
+
+        existing = collection.get(where={"gjenstandid": {"$in": list(item_ids)}}, include=["metadatas"])
+        indexed = {}
+        for doc_id, metadata in zip(existing['ids'], existing['metadatas']):
+            metadata = metadata or {}
+            indexed[doc_id] = (metadata.get("row_hash"), metadata.get("source"))
+
+        batch = []
+        current = set()
+        for row in rows:
+            row = {key: "" if value is None else str(value) for key, value in row.items()}
+            doc_id = bot_utils.row_id(row)
+            current.add(doc_id)
+            document, metadata = bot_utils.row_to_document(row)
+            metadata["source"] = "db"
+            # Also take over documents seeded from the CSV, so the CSV sync leaves them alone from now on
+            if indexed.get(doc_id) != (metadata["row_hash"], "db"):
+                batch.append((doc_id, document, metadata))
+        for i in range(0, len(batch), bot_utils.INGEST_BATCH_SIZE):
+            bot_utils.upsert_batch(collection, batch[i:i + bot_utils.INGEST_BATCH_SIZE])
+        removed = [doc_id for doc_id in indexed if doc_id not in current]
+        if removed:
+            collection.delete(ids=removed)
+        if batch or removed:
+            lexical_index.invalidate()
+            # Answers produced between the write and this point were retrieved from the old documents
+            answer_cache.clear()
+            # The other workers drop their lexical index and answers only now, see CRUDdb.invalidate_reindexed
+            invalidation_bus.publish("reindexed")
+
+        self.stats["batches"] += 1
+        self.stats["items_reindexed"] += len(item_ids)
+        self.stats["documents_upserted"] += len(batch)
+        self.stats["documents_deleted"] += len(removed)
+
+    @staticmethod
+    def _indexed_items(collection, field, values):
+        found = collection.get(where={field: {"$in": values}}, include=["metadatas"])
+        return {metadata["gjenstandid"] for metadata in found['metadatas'] if metadata and "gjenstandid" in metadata}
+
+
+index_sync = IndexSyncQueue()
@@ -0,0 +1,149 @@
+# src/utils/invalidation_bus.py
+import json
+import queue
+import select
+import threading
+import uuid
+
+from psycopg2 import extensions as pg_extensions
+
+import sql as sql_module
+import utils.constants as cs
+
+# Set to False when only one worker serves the API
+ENABLED = getattr(cs, "invalidation_bus_enabled", True)
+CHANNEL = getattr(cs, "invalidation_channel", "smartpack_invalidation")
+# Seconds between reconnect attempts when the listener connection drops
+RECONNECT_SECONDS = getattr(cs, "invalidation_reconnect", 5.0)
+POLL_SECONDS = 1.0
+# NOTIFY payloads must stay below 8000 bytes, larger batches are split
+MAX_PAYLOAD = 7000
+
+
+class InvalidationBus:
+    """Publishes cache invalidations to the other workers over Postgres LISTEN/NOTIFY and applies theirs.
+
+    One background thread owns a dedicated autocommit connection: it LISTENs on CHANNEL and
+    sends the events queued by publish() as NOTIFY batches, so write handlers never block on it.
+    """
+
+    def __init__(self, channel=CHANNEL):
+        self.channel = channel
+        # Events carry the origin so a worker ignores its own notifications
+        self.origin = uuid.uuid4().hex
+        self._outbox = queue.SimpleQueue()
+        # Taken from the outbox but not yet sent, kept until pg_notify succeeds. Only used by the bus thread.
+        self._unsent = []
+        self._handler = None
+        self._on_reconnect = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self.stats = {"published": 0, "notifications": 0, "received": 0, "ignored_own": 0,
+                      "errors": 0, "reconnects": 0, "connected": False}
+
+    # handler(kind, args) applies one remote event; on_reconnect() drops everything,
+    # since notifications sent while the listener was down are lost
+    def subscribe(self, handler, on_reconnect=None):
+        self._handler = handler
+        self._on_reconnect = on_reconnect
+
+    def publish(self, kind, **args):
+        if self._thread is not None:
+            self._outbox.put([kind, args])
+            self.stats["published"] += 1
+
+    def start(self):
+        if not ENABLED or self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="invalidation-bus", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10.0):
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        first = True
+        while not self._stopping.is_set():
+            conn = None
+            try:
+                conn = sql_module.create_connection()
+                conn.set_isolation_level(pg_extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {self.channel};")
+                self.stats["connected"] = True
+                if not first:
+                    self.stats["reconnects"] += 1
+                    if self._on_reconnect:
+                        self._on_reconnect()
+                first = False
+                self._loop(conn)
+                # Stopping: send whatever was published since the last poll
+                self._flush(conn)
+            except Exception as e:
+                # Unsent events stay queued and go out after the reconnect
+                self.stats["errors"] += 1
+                print(f"Invalidation bus connection lost, reconnecting in {RECONNECT_SECONDS}s: {e}")
+                self._stopping.wait(RECONNECT_SECONDS)
+            finally:
+                self.stats["connected"] = False
+                if conn is not None:
+                    conn.close()
+
+    def _loop(self, conn):
+        while not self._stopping.is_set():
+            self._flush(conn)
+            if select.select([conn], [], [], POLL_SECONDS) == ([], [], []):
+                continue
+            conn.poll()
+            while conn.notifies:
+                self._receive(conn.notifies.pop(0).payload)
+
+    # Sends everything queued so far, packed into as few notifications as the payload limit allows.
+    # Events leave _unsent only once their notification went out, so a failed send loses nothing.
+    def _flush(self, conn):
+        while True:
+            try:
+                self._unsent.append(self._outbox.get_nowait())
+            except queue.Empty:
+                break
+        with conn.cursor() as cur:
+            while self._unsent:
+                batch, size = [], 0
+                for event in self._unsent:
+                    encoded = json.dumps(event)
+                    if batch and size + len(encoded) > MAX_PAYLOAD:
+                        break
+                    batch.append(event)
+                    size += len(encoded) + 1
+                self._notify(cur, batch)
+                del self._unsent[:len(batch)]
+
+    def _notify(self, cur, events):
+        payload = json.dumps({"origin": self.origin, "events": events})
+        cur.execute("SELECT pg_notify(%s, %s);", (self.channel, payload))
+        self.stats["notifications"] += 1
+
+    def _receive(self, payload):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            self.stats["errors"] += 1
+            return
+        if message.get("origin") == self.origin:
+            self.stats["ignored_own"] += 1
+            return
+        for kind, args in message.get("events", []):
+            self.stats["received"] += 1
+            try:
+                self._handler(kind, args)
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"Could not apply invalidation {kind} {args}: {e}")
+
+
+invalidation_bus = InvalidationBus()
@@ -0,0 +1,205 @@
+# src/utils/lexical_index.py
+import itertools
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+import utils.constants as cs
+from utils import bot_utils
+
+# Name similarity (trigram Dice) from which a hit counts as a near-exact match, e.g. "Teltplugger" -> "Teltplugg"
+NEAR_EXACT_THRESHOLD = getattr(cs, "lexical_near_exact_threshold", 0.6)
+# Result slots reserved for rows of the items the question names, shared by all of them
+EXACT_MATCH_RESULTS = getattr(cs, "lexical_exact_match_results", 3)
+# Reciprocal rank fusion constant, higher values flatten the difference between ranks
+RRF_K = getattr(cs, "lexical_rrf_k", 60)
+# Item names count this many times more than descriptions in the BM25 score
+NAME_WEIGHT = 3
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_non_word = re.compile(r"[^\w]+")
+
+
+def normalize(text):
+    return _non_word.sub(" ", str(text).lower()).strip()
+
+
+# Character trigrams per word, padded so that word starts and ends are their own grams
+def trigrams(text):
+    grams = []
+    for word in normalize(text).split():
+        padded = f" {word} "
+        grams.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def dice(a, b):
+    return 2 * len(a & b) / (len(a) + len(b)) if a and b else 0.0
+
+
+class LexicalIndex:
+    """BM25 over character trigrams of item names and descriptions, built from the Chroma collection."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stale = True
+        self._docs = {}  # doc id -> (document, metadata)
+        self._postings = {}  # trigram -> {doc id: term frequency}
+        self._lengths = {}
+        self._avg_length = 0.0
+        self._names = {}  # normalized name -> (trigram set, word count, doc ids)
+        self.stats = {"docs": 0, "rebuilds": 0, "searches": 0, "exact_matches": 0, "fused": 0}
+
+    # Called after the Chroma collection changes, the next search rebuilds the index
+    def invalidate(self):
+        self._stale = True
+
+    def _rebuild(self):
+        found = bot_utils.get_collection().get(include=["documents", "metadatas"])
+        self.load(found['ids'], found['documents'], found['metadatas'])
+
+    # Builds the index from documents in the shape of collection.get, also used by the tests
+    def load(self, ids, documents, metadatas):
+        docs, postings, lengths = {}, defaultdict(dict), {}
+        names = {}
+        for doc_id, document, metadata in zip(ids, documents, metadatas):
+            metadata = metadata or {}
+            docs[doc_id] = (document, metadata)
+            terms = Counter(trigrams(document))
+            for gram in terms:
+                terms[gram] *= NAME_WEIGHT
+            terms.update(trigrams(metadata.get("gjenstandbeskrivelse", "")))
+            for gram, count in terms.items():
+                postings[gram][doc_id] = count
+            lengths[doc_id] = sum(terms.values())
+
+            name = normalize(document)
+            if name not in names:
+                names[name] = (set(trigrams(name)), len(name.split()), [])
+            names[name][2].append(doc_id)
+        self._docs, self._postings, self._lengths, self._names = docs, dict(postings), lengths, names
+        self._avg_length = sum(lengths.values()) / len(lengths) if lengths else 0.0
+        self._stale = False
+        self.stats["docs"] = len(docs)
+        self.stats["rebuilds"] += 1
+
+    def _ensure_built(self):
+        if self._stale:
+            with self._lock:
+                if self._stale:
+                    self._rebuild()
+
+    def _bm25(self, query_grams):
+        scores = defaultdict(float)
+        total = len(self._docs)
+        for gram, query_count in Counter(query_grams).items():
+            posting = self._postings.get(gram)
+            if not posting:
+                continue
+            idf = math.log(1 + (total - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, tf in posting.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[doc_id] / self._avg_length)
+                scores[doc_id] += query_count * idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    # Best trigram Dice between an item name and any run of question words of about the same length
+    def _name_similarities(self, query):
+        words = normalize(query).split()
+        padded = f" {' '.join(words)} "
+        windows = {}
+        similarities = {}
+        for name, (name_grams, name_words, doc_ids) in self._names.items():
+            if f" {name} " in padded:
+                similarity = 1.0
+            else:
+                similarity = 0.0
+                for size in {max(1, name_words - 1), name_words, name_words + 1}:
+                    if size not in windows:
+                        windows[size] = [set(trigrams(" ".join(words[i:i + size])))
+                                         for i in range(max(1, len(words) - size + 1))]
+                    for window in windows[size]:
+                        similarity = max(similarity, dice(name_grams, window))
+            if similarity >= NEAR_EXACT_THRESHOLD:
+                for doc_id in doc_ids:
+                    similarities[doc_id] = similarity
+        return similarities
+
+    # Returns [(doc id, bm25 score)] best first, and {doc id: name similarity} for near-exact name matches
+    def search(self, query, limit=10):
+        self._ensure_built()
+        scores = self._bm25(trigrams(query))
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return ranked, self._name_similarities(query)
+
+    def document(self, doc_id):
+        return self._docs.get(doc_id)
+
+
+lexical_index = LexicalIndex()
+
+
+# name_matches maps gjenstandid -> best name similarity, so callers can tell a confident single-item match
+def _as_results(hits, name_matches=None):
+    return {
+        'ids': [[doc_id for doc_id, _, _, _ in hits]],
+        'documents': [[document for _, document, _, _ in hits]],
+        'metadatas': [[metadata for _, _, metadata, _ in hits]],
+        'distances': [[distance for _, _, _, distance in hits]],
+        'name_matches': name_matches or {},
+    }
+
+
+# Hybrid retrieval in the shape of collection.query results: the Chroma and BM25 rankings are always
+# merged with reciprocal rank fusion. Rows of items the question names (near-exact name match) take
+# up to EXACT_MATCH_RESULTS of the n_results slots first, shared by all named items.
+def hybrid_search(query, embedding, n_results=5):
+    # A wider dense ranking also serves to confirm single-word name matches, see merge_results
+    dense = bot_utils.get_collection().query(query_embeddings=[embedding], n_results=2 * n_results)
+    return merge_results(query, dense, n_results)
+
+
+def merge_results(query, dense, n_results=5, index=None):
+    index = index or lexical_index
+    ranked, similarities = index.search(query, limit=2 * n_results)
+    index.stats["searches"] += 1
+
+    fused = defaultdict(float)
+    found = {}
+    distances = {}
+    for rank, doc_id in enumerate(dense['ids'][0]):
+        fused[doc_id] += 1 / (RRF_K + rank + 1)
+        found[doc_id] = (dense['documents'][0][rank], dense['metadatas'][0][rank])
+        distances[doc_id] = dense['distances'][0][rank]
+    for rank, (doc_id, _) in enumerate(ranked):
+        fused[doc_id] += 1 / (RRF_K + rank + 1)
+        found.setdefault(doc_id, index.document(doc_id))
+
+    # Single-word names are often everyday words as well ("bor", "mine"), so they only count when the
+    # dense search finds the item too. Names of several words are specific enough on their own.
+    dense_items = {(metadata or {}).get("gjenstandid") for metadata in dense['metadatas'][0]}
+    rows_by_item = defaultdict(list)
+    name_matches = {}
+    for doc_id, similarity in similarities.items():
+        document, metadata = index.document(doc_id)
+        item = metadata.get("gjenstandid")
+        if len(normalize(document).split()) < 2 and item not in dense_items:
+            continue
+        rows_by_item[item].append(doc_id)
+        name_matches[item] = max(similarity, name_matches.get(item, 0.0))
+        found.setdefault(doc_id, (document, metadata))
+
+    # Named rows in turn per item, best name first, so a second named item is not crowded out by the first
+    reserved = []
+    if rows_by_item:
+        index.stats["exact_matches"] += 1
+        items = sorted(rows_by_item, key=name_matches.get, reverse=True)
+        rows = [sorted(rows_by_item[item], key=lambda doc_id: fused.get(doc_id, 0.0), reverse=True) for item in items]
+        slots = min(EXACT_MATCH_RESULTS, n_results)
+        reserved = [doc_id for turn in itertools.zip_longest(*rows) for doc_id in turn if doc_id is not None][:slots]
+    index.stats["fused"] += 1
+    rest = [doc_id for doc_id in sorted(fused, key=fused.get, reverse=True) if doc_id not in reserved]
+    ids = reserved + rest[:n_results - len(reserved)]
+    return _as_results([(doc_id, *found[doc_id], distances.get(doc_id, 1.0 - similarities.get(doc_id, 0.0)))
+                        for doc_id in ids], name_matches)
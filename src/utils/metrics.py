@@ -0,0 +1,221 @@
+# src/utils/metrics.py
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import utils.constants as cs
+
+# Set to False to turn every observe/inc into a no-op
+ENABLED = getattr(cs, "metrics_enabled", True)
+# Upper bounds in seconds, from fast in-memory lookups up to slow model calls
+DEFAULT_BUCKETS = getattr(cs, "metrics_buckets", (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                                                  1.0, 2.5, 5.0, 10.0, 30.0))
+
+# Every metric registers itself here, /metrics renders them in order
+registry = []
+# Functions returning [(name, type, help, [(labels, value)])], called on every scrape for values
+# that are already counted elsewhere (cache stats, pool stats), so the hot path pays nothing for them
+collectors = []
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        if not ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [(self.name, dict(zip(self.labelnames, labels)), value) for labels, value in values.items()]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label set, as Prometheus expects them."""
+
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def observe(self, value, *labels):
+        if not ENABLED:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    # with histogram.time("label"): ... observes the seconds spent in the block
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self):
+        with self._lock:
+            values = {labels: list(counts) for labels, counts in self._values.items()}
+        samples = []
+        for labels, counts in values.items():
+            base = dict(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", {**base, "le": _format_value(float(bound))}, cumulative))
+            samples.append((f"{self.name}_sum", base, counts[-1]))
+            samples.append((f"{self.name}_count", base, cumulative))
+        return samples
+
+
+# Prometheus text exposition format, version 0.0.4
+def render():
+    lines = []
+    for metric in registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    for collector in collectors:
+        try:
+            families = collector()
+        except Exception as e:
+            print(f"Metrics collector {collector.__name__} failed: {e}")
+            continue
+        for name, metric_type, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# HTTP
+http_requests = Counter("smartpack_http_requests_total", "HTTP requests by route and status",
+                        ["method", "route", "status"])
+http_duration = Histogram("smartpack_http_request_duration_seconds",
+                          "Time until the full response was sent, including streamed bodies", ["method", "route"])
+http_in_flight = Gauge("smartpack_http_requests_in_flight", "Requests currently being handled by this worker")
+
+# Database: waiting for the executor, borrowing a pooled connection, running the statement,
+# and fetching plus converting the rows
+db_duration = Histogram("smartpack_db_seconds", "Database time by stage (queue, acquire, execute, fetch)", ["stage"])
+
+# Question answering
+query_stage_duration = Histogram("smartpack_query_stage_seconds",
+                                 "Time per /query stage (embedding, cache_lookup, retrieval, rule_engine, "
+                                 "format, prompt)", ["stage"])
+query_answers = Counter("smartpack_query_answers_total", "Answers by source (cache, rules, llm)", ["source"])
+llm_duration = Histogram("smartpack_llm_seconds",
+                         "Model call time (completion, or first_token and stream for streamed answers)", ["stage"])
+llm_requests = Counter("smartpack_llm_requests_total", "Model calls by outcome (ok, error, timeout)", ["outcome"])
+llm_tokens = Counter("smartpack_llm_tokens_total", "Tokens reported in openai_result.usage", ["type"])
+
+
+# Stats of every cache in utils.cache.caches (TTL caches and the semantic answer cache)
+def cache_collector():
+    from utils.cache import caches
+    stats = {name: cache.stats() for name, cache in list(caches.items())}
+    families = []
+    for key, metric_type, help in [
+        ("hits", "counter", "Cache lookups that found an entry"),
+        ("misses", "counter", "Cache lookups that found nothing"),
+        ("evictions", "counter", "Entries dropped to stay within maxsize"),
+        ("invalidations", "counter", "Entries dropped by writes"),
+        ("size", "gauge", "Entries currently cached"),
+    ]:
+        suffix = "_total" if metric_type == "counter" else ""
+        families.append((f"smartpack_cache_{key}{suffix}", metric_type, help,
+                         [({"cache": name}, values.get(key, 0)) for name, values in stats.items()]))
+    return families
+
+
+collectors.append(cache_collector)
+
+
+def process_collector():
+    return [("smartpack_process_pid", "gauge", "Process id, each worker reports its own metrics",
+             [({}, os.getpid())])]
+
+
+collectors.append(process_collector)
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware counting requests by route template, so streamed bodies are timed to the end."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ENABLED:
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_in_flight.dec()
+            # The matched route's template, never the raw path, keeps the label set small
+            route = scope.get("route")
+            route = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            http_duration.observe(time.perf_counter() - start, method, route)
+            http_requests.inc(method, route, str(status))
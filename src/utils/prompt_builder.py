@@ -0,0 +1,102 @@
+# src/utils/prompt_builder.py
+import threading
+from collections import deque
+
+import utils.constants as cs
+
+MODEL = "gpt-4o"
+# Upper bound for the user prompt (question, context and history), the system instructions are extra
+PROMPT_TOKEN_BUDGET = getattr(cs, "prompt_token_budget", 900)
+
+QUESTION_TEMPLATE = "This is the question: {question}\nThis is the information you will need to answer the question:\n"
+CONTEXT_SEPARATOR = "\n\n"
+HISTORY_HEADER = "\n\nChat history:\n"
+
+_encoding = None
+_stats_lock = threading.Lock()
+# Token breakdown of the most recent prompts, see prompt_stats
+recent_breakdowns = deque(maxlen=200)
+_totals = {"prompts": 0, "question": 0, "context": 0, "history": 0, "template": 0, "total": 0,
+           "context_chunks_dropped": 0, "history_turns_dropped": 0}
+
+
+# Loaded on the first prompt (or by bot_utils.warmup), not at import
+def get_encoding():
+    global _encoding
+    if _encoding is None:
+        import tiktoken
+        try:
+            _encoding = tiktoken.encoding_for_model(MODEL)
+        except KeyError:
+            _encoding = tiktoken.get_encoding("o200k_base")
+    return _encoding
+
+
+def count_tokens(text):
+    return len(get_encoding().encode(text))
+
+
+def format_turn(question, answer):
+    return f"User: {question}\nBot: {answer}"
+
+
+# Fills the budget by priority: the question always, then context chunks in rank order,
+# then the most recent chat turns. Returns the prompt and its token breakdown.
+def build_prompt(question, context_chunks, chat_history, budget=PROMPT_TOKEN_BUDGET):
+    head = QUESTION_TEMPLATE.format(question=question)
+    question_tokens = count_tokens(question)
+    template_tokens = count_tokens(head) - question_tokens + count_tokens(HISTORY_HEADER)
+    used = question_tokens + template_tokens
+
+    context, context_tokens = [], 0
+    separator_tokens = count_tokens(CONTEXT_SEPARATOR)
+    for chunk in context_chunks:
+        cost = count_tokens(chunk) + (separator_tokens if context else 0)
+        # A lower ranked but shorter chunk may still fit after a long one was skipped
+        if used + cost <= budget:
+            context.append(chunk)
+            context_tokens += cost
+            used += cost
+
+    history, history_tokens = [], 0
+    for q, a in reversed(list(chat_history)):
+        turn = format_turn(q, a)
+        cost = count_tokens(turn) + 1  # newline between turns
+        if used + cost > budget:
+            break
+        history.append(turn)
+        history_tokens += cost
+        used += cost
+    history.reverse()
+
+    prompt = head + CONTEXT_SEPARATOR.join(context) + HISTORY_HEADER + "\n".join(history)
+    breakdown = {
+        "budget": budget,
+        "question": question_tokens,
+        "context": context_tokens,
+        "history": history_tokens,
+        "template": template_tokens,
+        "total": used,
+        "context_chunks_used": len(context),
+        "context_chunks_dropped": len(context_chunks) - len(context),
+        "history_turns_used": len(history),
+        "history_turns_dropped": len(chat_history) - len(history),
+    }
+    return prompt, breakdown
+
+
+def record_breakdown(breakdown):
+    with _stats_lock:
+        recent_breakdowns.append(breakdown)
+        _totals["prompts"] += 1
+        for key in _totals:
+            if key != "prompts":
+                _totals[key] += breakdown.get(key, 0)
+
+
+def prompt_stats():
+    with _stats_lock:
+        prompts = _totals["prompts"]
+        averages = {key: round(value / prompts, 2) for key, value in _totals.items() if key != "prompts"} if prompts else {}
+        return {"budget": PROMPT_TOKEN_BUDGET, "prompts": prompts, "average": averages,
+                "recent": list(recent_breakdowns)[-20:]}
@@ -0,0 +1,121 @@
+# src/utils/rule_engine.py
+import re
+import threading
+
+import utils.constants as cs
+from utils.rule_index import rule_index
+
+# Set to False to send every question to the language model
+ENABLED = getattr(cs, "rule_engine_enabled", True)
+# Name similarity the question needs with exactly one item before it is answered from the rules alone
+MIN_SIMILARITY = getattr(cs, "rule_engine_min_similarity", 0.8)
+# Longer questions usually ask for more than the verdict ("kan jeg ta med X hvis ..."), they go to the model
+MAX_WORDS = getattr(cs, "rule_engine_max_words", 8)
+
+# The question must also ask about permission or amount, otherwise a name that happens to be an
+# everyday word ("Hvor bor du?") would get a confident answer about the item
+PERMISSION_CUES = getattr(cs, "rule_engine_cues", [
+    "lov", "tillatt", "tillate", "ta med", "kan jeg", "kan man", "får jeg", "få med", "greit", "ok",
+    "hvor mange", "hvor mye", "bagasje", "håndbagasje", "innsjekket", "medbringe", "pakke",
+])
+
+_stats_lock = threading.Lock()
+stats = {"questions": 0, "answered": 0, "fallback": 0, "errors": 0}
+
+
+def _count(key):
+    with _stats_lock:
+        stats[key] += 1
+
+
+def rule_stats():
+    with _stats_lock:
+        questions = stats["questions"]
+        return {**stats, "enabled": ENABLED, "hit_rate": round(stats["answered"] / questions, 4) if questions else 0.0}
+
+
+def _allowed(value):
+    return str(value).strip().lower() == "true"
+
+
+def verdict(hand, checked):
+    if hand and checked:
+        return "tillatt både i håndbagasjen og i innsjekket bagasje"
+    if hand:
+        return "tillatt i håndbagasjen, men ikke i innsjekket bagasje"
+    if checked:
+        return "ikke tillatt i håndbagasjen, men tillatt i innsjekket bagasje"
+    return "ikke tillatt, verken i håndbagasjen eller i innsjekket bagasje"
+
+
+# Rules with a limit in verdi (x<6cm, x<=100ml) only apply within it, "true" marks a plain yes/no rule
+def is_conditional(rule):
+    verdi = str(rule["verdi"] or "").strip()
+    return bool(verdi) and verdi.lower() != "true"
+
+
+def condition(rule):
+    if not is_conditional(rule):
+        return rule["betingelse"]
+    return f"{rule['betingelse']} {str(rule['verdi']).strip()}"
+
+
+# Templated Norwegian answer from the rows of rule_index.rules_for_item
+def format_answer(rules):
+    name = rules[0]["gjenstandnavn"]
+    if len(rules) == 1:
+        rule = rules[0]
+        limit = f" ({condition(rule)})" if is_conditional(rule) else ""
+        lines = [f"{name} er {verdict(_allowed(rule['tillatthandbagasje']), _allowed(rule['tillattinnsjekketbagasje']))}{limit}."]
+    else:
+        lines = [f"Reglene for {name} avhenger av situasjonen:"]
+        for rule in rules:
+            lines.append(f"• {condition(rule)}: "
+                         f"{verdict(_allowed(rule['tillatthandbagasje']), _allowed(rule['tillattinnsjekketbagasje']))}.")
+    descriptions = []
+    for rule in rules:
+        description = rule["regelverkbeskrivelse"].strip()
+        if description and description not in descriptions:
+            descriptions.append(description)
+    if descriptions:
+        lines.append("")
+        lines.extend(descriptions)
+    return "\n".join(lines)
+
+
+def has_permission_cue(question):
+    words = " ".join(re.findall(r"\w+", question.lower()))
+    padded = f" {words} "
+    return any(f" {cue} " in padded for cue in PERMISSION_CUES)
+
+
+# The single item the question names, or None when retrieval is not confident enough
+def confident_item(question, results):
+    matches = results.get("name_matches") or {}
+    if len(matches) != 1 or len(question.split()) > MAX_WORDS or not has_permission_cue(question):
+        return None
+    item, similarity = next(iter(matches.items()))
+    return item if similarity >= MIN_SIMILARITY else None
+
+
+# Returns a templated answer for questions about exactly one item, or None to fall back to the model
+async def answer(question, results):
+    if not ENABLED:
+        return None
+    _count("questions")
+    item = confident_item(question, results)
+    if item is None:
+        _count("fallback")
+        return None
+    try:
+        rules = await rule_index.rules_for_item(item)
+    except Exception as e:
+        print(f"Rule engine lookup failed, falling back to the model: {e}")
+        _count("errors")
+        _count("fallback")
+        return None
+    if not rules:
+        _count("fallback")
+        return None
+    _count("answered")
+    return format_answer(rules)
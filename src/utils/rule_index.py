@@ -0,0 +1,168 @@
+# src/utils/rule_index.py
+import threading
+
+import sql as sql_module
+
+RULE_COLUMNS = """
+    regelverkid,
+    kategoriid,
+    betingelse,
+    verdi,
+    tillatthandbagasje,
+    tillattinnsjekketbagasje,
+    COALESCE(beskrivelse, '') AS regelverkbeskrivelse
+"""
+ALL_RULES_QUERY = f"SELECT {RULE_COLUMNS} FROM regelverker;"
+RULES_BY_ID_QUERY = f"SELECT {RULE_COLUMNS} FROM regelverker WHERE regelverkid = ANY(%s);"
+ALL_ITEMS_QUERY = "SELECT gjenstandid, gjenstandnavn FROM gjenstander;"
+ITEMS_BY_ID_QUERY = "SELECT gjenstandid, gjenstandnavn FROM gjenstander WHERE gjenstandid = ANY(%s);"
+ALL_TAGS_QUERY = "SELECT gjenstandid, regelverkid FROM regelverktag;"
+TAGS_BY_ITEM_QUERY = "SELECT gjenstandid, regelverkid FROM regelverktag WHERE gjenstandid = ANY(%s);"
+ITEMS_BY_RULE_QUERY = "SELECT DISTINCT gjenstandid FROM regelverktag WHERE regelverkid = ANY(%s);"
+
+
+class RuleIndex:
+    """In-memory copy of the item/rule graph: gjenstandid -> rules and kategoriid -> rules.
+
+    The write hooks only mark ids as changed; the next lookup re-reads just those rows
+    before answering, so reads always see committed writes without a full join.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._rules = {}  # regelverkid -> rule row
+        self._item_names = {}  # gjenstandid -> gjenstandnavn
+        self._item_rules = {}  # gjenstandid -> sorted regelverkids
+        self._category_rules = {}  # kategoriid -> sorted regelverkids
+        self._loaded = False
+        self._full_requests = 0
+        self._dirty_rules = set()
+        self._dirty_items = set()
+        self.stats = {"rules": 0, "items": 0, "lookups": 0, "full_loads": 0, "refreshes": 0}
+
+    def mark_rule(self, *regelverkids):
+        with self._lock:
+            self._dirty_rules.update(i for i in regelverkids if i is not None)
+
+    def mark_item(self, *gjenstandids):
+        with self._lock:
+            self._dirty_items.update(i for i in gjenstandids if i is not None)
+
+    # For writes that can touch any part of the graph, e.g. a deleted category
+    def mark_all(self):
+        with self._lock:
+            self._full_requests += 1
+            self._loaded = False
+
+    def _needs_refresh(self):
+        return not self._loaded or self._dirty_rules or self._dirty_items
+
+    def load(self, conn):
+        with self._lock:
+            requested = self._full_requests
+            self._dirty_rules.clear()
+            self._dirty_items.clear()
+        rules = {row["regelverkid"]: row for row in sql_module.fetch_rows(conn, ALL_RULES_QUERY)}
+        names = {row["gjenstandid"]: row["gjenstandnavn"] for row in sql_module.fetch_rows(conn, ALL_ITEMS_QUERY)}
+        links = {}
+        for gjenstandid, regelverkid in sql_module.fetch_rows(conn, ALL_TAGS_QUERY, as_dict=False):
+            links.setdefault(gjenstandid, set()).add(regelverkid)
+        with self._lock:
+            self._rules = rules
+            self._item_names = names
+            self._item_rules = {item: sorted(ids) for item, ids in links.items()}
+            self._rebuild_categories()
+            # A mark_all() while loading may not be reflected in what was read
+            self._loaded = requested == self._full_requests
+            self._update_counts()
+        self.stats["full_loads"] += 1
+
+    def _rebuild_categories(self):
+        categories = {}
+        for regelverkid, rule in self._rules.items():
+            categories.setdefault(rule["kategoriid"], []).append(regelverkid)
+        self._category_rules = {kategoriid: sorted(ids) for kategoriid, ids in categories.items()}
+
+    def _update_counts(self):
+        self.stats["rules"] = len(self._rules)
+        self.stats["items"] = len(self._item_names)
+
+    # Re-reads only the rules and items marked since the last lookup
+    def refresh(self, conn):
+        with self._refresh_lock:
+            with self._lock:
+                if not self._loaded:
+                    full = True
+                else:
+                    full = False
+                    rules, items = self._dirty_rules, self._dirty_items
+                    self._dirty_rules, self._dirty_items = set(), set()
+            if full:
+                self.load(conn)
+                return
+            if not rules and not items:
+                return
+            try:
+                self._apply(conn, rules, items)
+            except Exception:
+                # Keep the ids marked so the next lookup retries
+                self.mark_rule(*rules)
+                self.mark_item(*items)
+                raise
+            self.stats["refreshes"] += 1
+
+    def _apply(self, conn, rules, items):
+        items = set(items)
+        changed_rules = {}
+        if rules:
+            changed_rules = {row["regelverkid"]: row
+                             for row in sql_module.fetch_rows(conn, RULES_BY_ID_QUERY, (list(rules),))}
+            # Tags of changed or deleted rules may have changed too, re-read the items that use them
+            items.update(row[0] for row in sql_module.fetch_rows(conn, ITEMS_BY_RULE_QUERY, (list(rules),), as_dict=False))
+            with self._lock:
+                items.update(item for item, ids in self._item_rules.items() if rules.intersection(ids))
+        names, links = {}, {}
+        if items:
+            names = {row["gjenstandid"]: row["gjenstandnavn"]
+                     for row in sql_module.fetch_rows(conn, ITEMS_BY_ID_QUERY, (list(items),))}
+            for gjenstandid, regelverkid in sql_module.fetch_rows(conn, TAGS_BY_ITEM_QUERY, (list(items),), as_dict=False):
+                links.setdefault(gjenstandid, set()).add(regelverkid)
+
+        with self._lock:
+            for regelverkid in rules:
+                if regelverkid in changed_rules:
+                    self._rules[regelverkid] = changed_rules[regelverkid]
+                else:
+                    self._rules.pop(regelverkid, None)
+            for gjenstandid in items:
+                if gjenstandid in names:
+                    self._item_names[gjenstandid] = names[gjenstandid]
+                    self._item_rules[gjenstandid] = sorted(links.get(gjenstandid, ()))
+                else:
+                    self._item_names.pop(gjenstandid, None)
+                    self._item_rules.pop(gjenstandid, None)
+            if rules:
+                self._rebuild_categories()
+            self._update_counts()
+
+    async def _ensure_fresh(self):
+        if self._needs_refresh():
+            await sql_module.run_async(self.refresh)
+        self.stats["lookups"] += 1
+
+    # Rules tagged on one item ordered by regelverkid, with the item name added
+    async def rules_for_item(self, gjenstandid):
+        await self._ensure_fresh()
+        with self._lock:
+            name = self._item_names.get(gjenstandid)
+            return [{**self._rules[regelverkid], "gjenstandnavn": name}
+                    for regelverkid in self._item_rules.get(gjenstandid, ()) if regelverkid in self._rules]
+
+    async def rules_for_category(self, kategoriid):
+        await self._ensure_fresh()
+        with self._lock:
+            return [dict(self._rules[regelverkid]) for regelverkid in self._category_rules.get(kategoriid, ())]
+
+
+rule_index = RuleIndex()
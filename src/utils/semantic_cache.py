@@ -0,0 +1,104 @@
+# src/utils/semantic_cache.py
+import threading
+import time
+from collections import OrderedDict
+
+import utils.constants as cs
+from utils.cache import caches
+
+# Cosine similarity a new question needs with a cached one to reuse its answer
+SIMILARITY_THRESHOLD = getattr(cs, "semantic_cache_threshold", 0.92)
+MAXSIZE = getattr(cs, "semantic_cache_maxsize", 1000)
+TTL = getattr(cs, "semantic_cache_ttl", 3600)
+
+
+class SemanticCache:
+    """Answers keyed by question embedding, served for sufficiently similar questions."""
+
+    def __init__(self, name, threshold=SIMILARITY_THRESHOLD, maxsize=MAXSIZE, ttl=TTL):
+        self.name = name
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # id -> (unit vector, question, answer, expires)
+        self._matrix = None
+        self._matrix_ids = []
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        caches[name] = self
+
+    @staticmethod
+    def _normalize(embedding):
+        import numpy as np  # only needed once answers are cached, keeps CRUD-only workers light
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self, now):
+        expired = [entry_id for entry_id, entry in self._entries.items() if entry[3] <= now]
+        for entry_id in expired:
+            del self._entries[entry_id]
+        if expired:
+            self._matrix = None
+
+    # Returns (answer, similarity, cached question) for the best match above the threshold, or None
+    def lookup(self, embedding):
+        import numpy as np
+        vector = self._normalize(embedding)
+        with self._lock:
+            self._expire(time.monotonic())
+            if self._entries:
+                if self._matrix is None:
+                    self._matrix_ids = list(self._entries)
+                    self._matrix = np.stack([self._entries[entry_id][0] for entry_id in self._matrix_ids])
+                similarities = self._matrix @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry_id = self._matrix_ids[best]
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    _, question, answer, _ = self._entries[entry_id]
+                    return answer, float(similarities[best]), question
+            self.misses += 1
+            return None
+
+    # generation is read before the answer was produced; a rule change in between discards it
+    def store(self, question, embedding, answer, generation=None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[self._next_id] = (self._normalize(embedding), question, answer, time.monotonic() + self.ttl)
+            self._next_id += 1
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+answer_cache = SemanticCache("answers")
@@ -0,0 +1,96 @@
+# Throughput of row-by-row inserts (one commit per row, like create_item) vs. sql.execute_bulk.
+# Works on TEMP tables that shadow the real ones for this connection only, so nothing is written
+# to the application's tables. Needs the database configured in src/utils/constants.py.
+import csv
+import os
+import sys
+import time
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(TEST_DIR, "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+import sql as sql_module  # noqa: E402
+
+CSV_FILE = os.path.join(SRC_DIR, "data", "c.csv")
+OUTPUT_FILE = os.path.join(TEST_DIR, "testresults", "bulk_insert_benchmark.txt")
+ROUNDS = 5
+
+SINGLE_INSERT = """
+INSERT INTO gjenstander (gjenstandnavn, beskrivelse, kategoriid)
+VALUES (%s, %s, %s)
+RETURNING gjenstandid;
+"""
+BULK_INSERT = """
+INSERT INTO gjenstander (gjenstandnavn, beskrivelse, kategoriid)
+VALUES %s
+RETURNING gjenstandid;
+"""
+
+
+def load_rows():
+    with open(CSV_FILE, newline='') as csvfile:
+        return [(row['gjenstandnavn'], row['gjenstandbeskrivelse'], int(row['gjenstandkategoriid']))
+                for row in csv.DictReader(csvfile)]
+
+
+def reset_table(conn):
+    with conn.cursor() as cur:
+        cur.execute("DROP TABLE IF EXISTS pg_temp.gjenstander")
+        cur.execute("""
+        CREATE TEMP TABLE gjenstander (
+            gjenstandid SERIAL PRIMARY KEY,
+            gjenstandnavn TEXT NOT NULL,
+            beskrivelse TEXT,
+            kategoriid INTEGER NOT NULL
+        )
+        """)
+    conn.commit()
+
+
+def row_by_row(conn, rows):
+    for values in rows:
+        with conn.cursor() as cur:
+            cur.execute(SINGLE_INSERT, values)
+            cur.fetchone()
+        conn.commit()
+
+
+def bulk(conn, rows):
+    results = sql_module.execute_bulk(conn, BULK_INSERT, rows)
+    assert all(row is not None for row, _ in results)
+
+
+def measure(conn, func, rows):
+    timings = []
+    for _ in range(ROUNDS):
+        reset_table(conn)
+        start = time.perf_counter()
+        func(conn, rows)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return best, len(rows) / best
+
+
+if __name__ == "__main__":
+    rows = load_rows()
+    conn = sql_module.create_connection()
+    try:
+        single_time, single_rate = measure(conn, row_by_row, rows)
+        bulk_time, bulk_rate = measure(conn, bulk, rows)
+    finally:
+        conn.close()
+
+    with open(OUTPUT_FILE, "w") as f:
+        f.write("=" * 50 + "\n")
+        f.write(" " * 12 + "BULK INSERT BENCHMARK\n")
+        f.write("=" * 50 + "\n\n")
+        f.write(f"Rows per run: {len(rows)} (src/data/c.csv), best of {ROUNDS} runs\n\n")
+        f.write(f"{'Mode':<20}{'seconds':>10}{'rows/s':>12}\n")
+        f.write("-" * 42 + "\n")
+        f.write(f"{'row by row':<20}{single_time:>10.3f}{single_rate:>12.0f}\n")
+        f.write(f"{'execute_bulk':<20}{bulk_time:>10.3f}{bulk_rate:>12.0f}\n")
+        f.write(f"\nSpeedup: {single_time / bulk_time:.1f}x\n")
+        f.write("=" * 50 + "\n")
+
+    print(open(OUTPUT_FILE).read())
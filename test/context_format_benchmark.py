@@ -0,0 +1,53 @@
+# Token counts of the retrieved context for every test question: format_nicely vs. format_compact.
+# Uses the same Chroma collection and retrieval as /query, no LLM calls are made.
+import os
+import sys
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(TEST_DIR, "..", "src")
+sys.path.insert(0, SRC_DIR)
+sys.path.insert(0, TEST_DIR)
+# bot_utils resolves the CSV and the Chroma store relative to src/
+os.chdir(SRC_DIR)
+
+from utils import bot_utils  # noqa: E402
+from utils.prompt_builder import count_tokens  # noqa: E402
+from testdata import test_data as td  # noqa: E402
+
+OUTPUT_FILE = os.path.join(TEST_DIR, "testresults", "context_format_benchmark.txt")
+N_RESULTS = 5
+
+if __name__ == "__main__":
+    rows = []
+    for question in td.test_questions:
+        response = bot_utils.collection.query(
+            query_embeddings=[bot_utils.embed_query(question)],
+            n_results=N_RESULTS
+        )
+        nicely = count_tokens("\n\n".join(bot_utils.format_nicely(response)))
+        compact = count_tokens("\n\n".join(bot_utils.format_compact(response)))
+        rows.append((question, nicely, compact))
+
+    total_nicely = sum(nicely for _, nicely, _ in rows)
+    total_compact = sum(compact for _, _, compact in rows)
+    num_questions = len(rows)
+
+    with open(OUTPUT_FILE, "w") as f:
+        f.write("=" * 50 + "\n")
+        f.write(" " * 10 + "CONTEXT FORMAT TOKEN BENCHMARK\n")
+        f.write("=" * 50 + "\n\n")
+        f.write(f"Questions: {num_questions}, hits per question: {N_RESULTS}\n\n")
+
+        f.write("AVERAGE CONTEXT TOKENS PER QUESTION\n")
+        f.write("-" * 50 + "\n")
+        f.write(f"format_nicely: {total_nicely / num_questions:.2f}\n")
+        f.write(f"format_compact: {total_compact / num_questions:.2f}\n")
+        f.write(f"Reduction: {100 * (1 - total_compact / total_nicely):.1f}%\n\n")
+
+        f.write("PER QUESTION (nicely / compact)\n")
+        f.write("-" * 50 + "\n")
+        for question, nicely, compact in rows:
+            f.write(f"{nicely:>5} / {compact:<5} {question}\n")
+        f.write("=" * 50 + "\n")
+
+    print(open(OUTPUT_FILE).read())
@@ -0,0 +1,278 @@
+# Evaluation runner for the question answering pipeline, replaces OriginialBot_test.py and LangChainBot_test.py.
+#
+# Runs every question in testdata/test_data.py through the same steps as /query (embedding, retrieval,
+# context formatting, budgeted prompt, gpt-4o) for each combination of the variants given on the
+# command line. Questions run concurrently, and live model calls are rate limited. Reports time per
+# stage, tokens, cost and retrieval hits per variant.
+#
+#   python eval_runner.py                             # live calls, answers are saved to the recordings file
+#   python eval_runner.py --mode replay               # offline and deterministic, answers come from the recordings
+#   python eval_runner.py --mode replay --retrieval dense hybrid --format nicely compact
+#
+# Replay needs a recording for every prompt, so record each new variant once before replaying it.
+import argparse
+import asyncio
+import csv
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(TEST_DIR, "..", "src")
+sys.path.insert(0, SRC_DIR)
+sys.path.insert(0, TEST_DIR)
+# bot_utils resolves the CSV and the Chroma store relative to src/
+os.chdir(SRC_DIR)
+
+import utils.constants as cs  # noqa: E402
+from utils import bot_utils, prompt_builder  # noqa: E402
+from utils.lexical_index import hybrid_search, lexical_index  # noqa: E402
+from testdata import test_data as td  # noqa: E402
+from testdata.labelled_questions import LABELLED_QUESTIONS  # noqa: E402
+
+RESULTS_DIR = os.path.join(TEST_DIR, "testresults")
+RECORDINGS_FILE = os.path.join(TEST_DIR, "testdata", "eval_recordings.json")
+STAGES = ["embedding", "retrieval", "prompt", "llm", "total"]
+# USD per 1M tokens (prompt, completion)
+PRICES = getattr(cs, "eval_prices", {"gpt-4o": (5.00, 15.00)})
+# Monthly volume the cost is projected to
+PROJECTED_QUERIES = 4200
+
+
+class RateLimiter:
+    """Spaces the starts of live model calls so at most `per_minute` begin in any minute."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class Recordings:
+    """Model answers keyed by a hash of the exact messages sent, stored as JSON."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+        self.added = 0
+
+    @staticmethod
+    def key(messages):
+        payload = json.dumps({"model": prompt_builder.MODEL, "messages": messages}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def get(self, messages):
+        return self.entries.get(self.key(messages))
+
+    def put(self, messages, answer, prompt_tokens, completion_tokens):
+        self.entries[self.key(messages)] = {"answer": answer, "prompt_tokens": prompt_tokens,
+                                            "completion_tokens": completion_tokens}
+        self.added += 1
+
+    def save(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=1, ensure_ascii=False, sort_keys=True)
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def retrieve(variant, question, embedding):
+    if variant.retrieval == "hybrid":
+        return hybrid_search(question, embedding, n_results=variant.n_results)
+    return bot_utils.get_collection().query(query_embeddings=[embedding], n_results=variant.n_results)
+
+
+def build_messages(variant, question, results):
+    if variant.format == "compact":
+        chunks = bot_utils.format_compact(results)
+    else:
+        chunks = bot_utils.format_nicely(results)
+    # Questions run independently, so there is no chat history
+    prompt, breakdown = prompt_builder.build_prompt(question, chunks, [], budget=variant.budget)
+    messages = [
+        {"role": "system", "content": bot_utils.instructions_str},
+        {"role": "user", "content": prompt}
+    ]
+    return messages, breakdown
+
+
+async def complete(messages, mode, recordings, limiter):
+    if mode == "replay":
+        recorded = recordings.get(messages)
+        if recorded is None:
+            raise LookupError("No recorded answer for this prompt, run with --mode record first")
+        return recorded["answer"], recorded["prompt_tokens"], recorded["completion_tokens"]
+    await limiter.wait()
+    completion = await bot_utils.openai_completion_async(messages)
+    answer = completion.choices[0].message.content
+    prompt_tokens, completion_tokens = completion.usage.prompt_tokens, completion.usage.completion_tokens
+    if mode == "record":
+        recordings.put(messages, answer, prompt_tokens, completion_tokens)
+    return answer, prompt_tokens, completion_tokens
+
+
+async def evaluate(variant, question, mode, recordings, limiter, slots):
+    row = {"question": question, "answer": "", "error": "", "prompt_tokens": 0, "completion_tokens": 0,
+           "context_chunks_used": 0, "context_chunks_dropped": 0, "retrieval_hit": None}
+    async with slots:
+        start = time.perf_counter()
+        try:
+            embedding, row["embedding"] = await asyncio.to_thread(timed, bot_utils.embed_query, question)
+            results, row["retrieval"] = await asyncio.to_thread(timed, retrieve, variant, question, embedding)
+            (messages, breakdown), row["prompt"] = timed(build_messages, variant, question, results)
+            row["context_chunks_used"] = breakdown["context_chunks_used"]
+            row["context_chunks_dropped"] = breakdown["context_chunks_dropped"]
+            expected = LABELLED_QUESTIONS.get(question)
+            if expected:
+                row["retrieval_hit"] = all(name in results['documents'][0] for name in expected)
+            llm_start = time.perf_counter()
+            answer, prompt_tokens, completion_tokens = await complete(messages, mode, recordings, limiter)
+            row["llm"] = time.perf_counter() - llm_start
+            row.update(answer=answer, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        except Exception as e:
+            row["error"] = f"{type(e).__name__}: {e}"
+        row["total"] = time.perf_counter() - start
+    return row
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def summarize(rows, wall_time, model):
+    ok = [row for row in rows if not row["error"]]
+    price_in, price_out = PRICES.get(model, (0.0, 0.0))
+    prompt_tokens = sum(row["prompt_tokens"] for row in ok)
+    completion_tokens = sum(row["completion_tokens"] for row in ok)
+    cost = (prompt_tokens * price_in + completion_tokens * price_out) / 1_000_000
+    labelled = [row["retrieval_hit"] for row in rows if row["retrieval_hit"] is not None]
+    return {
+        "questions": len(rows),
+        "errors": len(rows) - len(ok),
+        "wall_time": wall_time,
+        "stages": {stage: {
+            "mean": sum(row[stage] for row in ok if stage in row) / max(1, len(ok)),
+            "p50": percentile([row[stage] for row in ok if stage in row], 0.5),
+            "p95": percentile([row[stage] for row in ok if stage in row], 0.95),
+        } for stage in STAGES},
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cost": cost,
+        "projected_cost": cost / max(1, len(ok)) * PROJECTED_QUERIES,
+        "context_chunks_dropped": sum(row["context_chunks_dropped"] for row in ok),
+        "retrieval_hits": (sum(labelled), len(labelled)),
+    }
+
+
+def write_results_csv(rows, path):
+    fields = ["question", "answer", "error", *STAGES, "prompt_tokens", "completion_tokens",
+              "context_chunks_used", "context_chunks_dropped", "retrieval_hit"]
+    with open(path, mode='w', newline='', encoding="utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({key: round(value, 4) if isinstance(value, float) else value for key, value in row.items()})
+
+
+def write_report(summaries, args, path):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("=" * 60 + "\n")
+        f.write(" " * 18 + "RAG EVALUATION REPORT\n")
+        f.write("=" * 60 + "\n\n")
+        f.write(f"Mode: {args.mode}, concurrency: {args.concurrency}, rate limit: {args.rpm or 'none'} calls/min, "
+                f"model: {prompt_builder.MODEL}\n\n")
+        for name, summary in summaries.items():
+            hits, labelled = summary["retrieval_hits"]
+            f.write(f"VARIANT {name}\n")
+            f.write("-" * 60 + "\n")
+            f.write(f"Questions: {summary['questions']}, errors: {summary['errors']}, "
+                    f"wall time: {summary['wall_time']:.1f}s\n")
+            f.write(f"Retrieval hits on labelled questions: {hits}/{labelled}\n")
+            f.write(f"{'stage':<12}{'mean ms':>12}{'p50 ms':>12}{'p95 ms':>12}\n")
+            for stage, stats in summary["stages"].items():
+                f.write(f"{stage:<12}{1000 * stats['mean']:>12.1f}{1000 * stats['p50']:>12.1f}"
+                        f"{1000 * stats['p95']:>12.1f}\n")
+            f.write(f"Prompt tokens: {summary['prompt_tokens']}, response tokens: {summary['completion_tokens']}, "
+                    f"context chunks dropped by the budget: {summary['context_chunks_dropped']}\n")
+            f.write(f"Cost: ${summary['cost']:.4f}, estimated for {PROJECTED_QUERIES} queries: "
+                    f"${summary['projected_cost']:.2f}\n\n")
+        f.write("=" * 60 + "\n")
+
+
+async def run(args):
+    recordings = Recordings(args.recordings)
+    limiter = RateLimiter(args.rpm)
+    slots = asyncio.Semaphore(args.concurrency)
+    questions = td.test_questions[:args.limit] if args.limit else td.test_questions
+
+    # Loads Chroma, the embedding model and the lexical index up front so the first questions are not slower
+    await asyncio.to_thread(bot_utils.get_collection)
+    await asyncio.to_thread(bot_utils.embed_query, "warmup")
+    await asyncio.to_thread(lexical_index.search, "warmup")
+
+    summaries = {}
+    try:
+        for retrieval, context_format, budget in itertools.product(args.retrieval, args.format, args.budget):
+            variant = SimpleNamespace(retrieval=retrieval, format=context_format, budget=budget, n_results=args.n_results)
+            name = f"{retrieval}-{context_format}-{budget}"
+            start = time.perf_counter()
+            rows = await asyncio.gather(*(evaluate(variant, question, args.mode, recordings, limiter, slots)
+                                          for question in questions))
+            summaries[name] = summarize(rows, time.perf_counter() - start, prompt_builder.MODEL)
+            write_results_csv(rows, os.path.join(RESULTS_DIR, f"eval_{name}.csv"))
+            print(f"{name}: {summaries[name]['errors']} errors, {summaries[name]['wall_time']:.1f}s")
+    finally:
+        if recordings.added:
+            recordings.save()
+            print(f"{recordings.added} answers recorded to {args.recordings}")
+        await bot_utils.close()
+    return summaries
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Evaluate retrieval and prompt variants on the test questions")
+    parser.add_argument("--mode", choices=["live", "record", "replay"], default="record",
+                        help="replay answers from the recordings file, or call the model (record also saves them)")
+    parser.add_argument("--retrieval", nargs="+", choices=["dense", "hybrid"], default=["hybrid"])
+    parser.add_argument("--format", nargs="+", choices=["compact", "nicely"], default=["compact"])
+    parser.add_argument("--budget", nargs="+", type=int, default=[prompt_builder.PROMPT_TOKEN_BUDGET],
+                        help="Prompt token budgets to try")
+    parser.add_argument("--n-results", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8, help="Questions evaluated at once")
+    parser.add_argument("--rpm", type=float, default=60, help="Live model calls started per minute, 0 for no limit")
+    parser.add_argument("--limit", type=int, default=0, help="Only the first N questions")
+    parser.add_argument("--recordings", default=RECORDINGS_FILE)
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "eval_report.txt"))
+    args = parser.parse_args()
+    if args.mode == "replay" and not os.path.exists(args.recordings):
+        parser.error(f"{args.recordings} does not exist, run with --mode record first")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    summaries = asyncio.run(run(args))
+    write_report(summaries, args, args.output)
+    print(open(args.output, encoding="utf-8").read())
@@ -0,0 +1,542 @@
+# HTTP load test for the API in src/main.py.
+#
+# Starts the app in a separate process against a Postgres stand-in, with stubbed LLM and embedding
+# backends, and drives every CRUD route plus /query and /query/stream at a fixed concurrency.
+# Reports RPS, error rates and p50/p95/p99 latency per route and saves them as JSON under
+# testresults/load_test/, so runs can be compared with --compare.
+#
+# The stand-in is the schema "loadtest" (dropped and recreated on every run) in the database given by
+# LOADTEST_DBNAME/LOADTEST_HOST/LOADTEST_USER/LOADTEST_PASSWORD. The first two are required, so the
+# app database from utils/constants.py is never touched by accident. A throwaway local Postgres works well:
+#   docker run --rm -p 5432:5432 -e POSTGRES_PASSWORD=loadtest postgres:16
+#   LOADTEST_DBNAME=postgres LOADTEST_HOST=localhost LOADTEST_USER=postgres LOADTEST_PASSWORD=loadtest \
+#       python load_test.py --concurrency 32 --duration 60
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+from urllib.parse import quote
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(TEST_DIR, "..", "src")
+RESULTS_DIR = os.path.join(TEST_DIR, "testresults", "load_test")
+sys.path.insert(0, SRC_DIR)
+sys.path.insert(0, TEST_DIR)
+
+SCHEMA = "loadtest"
+CSV_FILE = os.path.join(SRC_DIR, "data", "c.csv")
+EMBEDDING_DIMENSIONS = 256
+
+SCHEMA_SQL = f"""
+DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;
+CREATE SCHEMA {SCHEMA};
+CREATE TABLE kategorier (
+    kategoriid SERIAL PRIMARY KEY,
+    navn TEXT NOT NULL,
+    beskrivelse TEXT
+);
+CREATE TABLE gjenstander (
+    gjenstandid SERIAL PRIMARY KEY,
+    gjenstandnavn TEXT NOT NULL,
+    beskrivelse TEXT,
+    kategoriid INTEGER NOT NULL REFERENCES kategorier ON DELETE CASCADE
+);
+CREATE TABLE regelverker (
+    regelverkid SERIAL PRIMARY KEY,
+    kategoriid INTEGER NOT NULL REFERENCES kategorier ON DELETE CASCADE,
+    betingelse TEXT NOT NULL,
+    verdi TEXT NOT NULL,
+    tillatthandbagasje BOOLEAN NOT NULL,
+    tillattinnsjekketbagasje BOOLEAN NOT NULL,
+    beskrivelse TEXT
+);
+CREATE TABLE regelverktag (
+    regelverktagid SERIAL PRIMARY KEY,
+    gjenstandid INTEGER NOT NULL REFERENCES gjenstander ON DELETE CASCADE,
+    regelverkid INTEGER NOT NULL REFERENCES regelverker ON DELETE CASCADE
+);
+"""
+
+
+# Every connection of the server and of this script uses the stand-in schema only.
+# Must run before the app is imported, the invalidation bus reads its settings at import.
+def use_stand_in_database():
+    missing = [name for name in ["LOADTEST_DBNAME", "LOADTEST_HOST"] if not os.environ.get(name)]
+    if missing:
+        raise SystemExit(f"Set {' and '.join(missing)} to a throwaway database, the load test drops "
+                         f"and recreates the schema {SCHEMA} in it")
+    os.environ["PGOPTIONS"] = f"-c search_path={SCHEMA}"
+    import utils.constants as cs
+    # A single server process needs no bus, and it must not invalidate caches of real instances
+    cs.invalidation_bus_enabled = False
+    # Stub vectors would only fill the embedding cache file of the real app
+    cs.embedding_cache_enabled = False
+    for name in ["dbname", "host", "user", "password"]:
+        value = os.environ.get(f"LOADTEST_{name.upper()}")
+        if value:
+            setattr(cs, name, value)
+
+
+def create_stand_in_database():
+    import sql as sql_module
+    from psycopg2.extras import execute_values
+
+    with open(CSV_FILE, newline='') as csvfile:
+        rows = list(csv.DictReader(csvfile))
+    categories = {int(row['gjenstandkategoriid']): (row['kategorinavn'], row['kategoribeskrivelse']) for row in rows}
+    items = {int(row['gjenstandid']): (row['gjenstandnavn'], row['gjenstandbeskrivelse'], int(row['gjenstandkategoriid']))
+             for row in rows}
+    rules = {int(row['regelverkid']): (int(row['gjenstandkategoriid']), row['betingelse'], row['verdi'],
+                                       row['tillatthandbagasje'].lower() == "true",
+                                       row['tillattinnsjekketbagasje'].lower() == "true", row['regelverkbeskrivelse'])
+             for row in rows}
+    tags = {(int(row['gjenstandid']), int(row['regelverkid'])) for row in rows}
+
+    conn = sql_module.create_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SCHEMA_SQL)
+            execute_values(cur, "INSERT INTO kategorier (kategoriid, navn, beskrivelse) VALUES %s",
+                           [(k, *v) for k, v in categories.items()])
+            execute_values(cur, "INSERT INTO gjenstander (gjenstandid, gjenstandnavn, beskrivelse, kategoriid) VALUES %s",
+                           [(k, *v) for k, v in items.items()])
+            execute_values(cur, """INSERT INTO regelverker (regelverkid, kategoriid, betingelse, verdi, tillatthandbagasje,
+                                   tillattinnsjekketbagasje, beskrivelse) VALUES %s""",
+                           [(k, *v) for k, v in rules.items()])
+            execute_values(cur, "INSERT INTO regelverktag (gjenstandid, regelverkid) VALUES %s", sorted(tags))
+            for table, column in [("kategorier", "kategoriid"), ("gjenstander", "gjenstandid"),
+                                  ("regelverker", "regelverkid"), ("regelverktag", "regelverktagid")]:
+                cur.execute(f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), "
+                            f"(SELECT COALESCE(MAX({column}), 1) FROM {table}))")
+        conn.commit()
+    finally:
+        conn.close()
+    return {"kategorier": len(categories), "gjenstander": len(items), "regelverker": len(rules),
+            "regelverktag": len(tags)}
+
+
+# Stubbed backends, installed in the server process only
+
+class StubEmbeddingFunction:
+    """Deterministic bag-of-trigrams vectors, so similar texts still land close together."""
+
+    def __call__(self, input):
+        vectors = []
+        for text in input:
+            vector = [0.0] * EMBEDDING_DIMENSIONS
+            padded = f" {text.lower()} "
+            for i in range(len(padded) - 2):
+                bucket = int(hashlib.md5(padded[i:i + 3].encode()).hexdigest()[:8], 16) % EMBEDDING_DIMENSIONS
+                vector[bucket] += 1.0
+            norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+            vectors.append([value / norm for value in vector])
+        return vectors
+
+
+class StubStream:
+    def __init__(self, tokens, delay, usage=None):
+        self._tokens = iter(tokens)
+        self._delay = delay
+        self._usage = usage
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        token = next(self._tokens, None)
+        if token is None:
+            # With stream_options={"include_usage": True} the last chunk has no choices, only usage
+            usage, self._usage = self._usage, None
+            if usage is None:
+                raise StopAsyncIteration
+            return SimpleNamespace(choices=[], usage=usage)
+        await asyncio.sleep(self._delay)
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))], usage=None)
+
+    async def close(self):
+        pass
+
+
+class StubCompletions:
+    def __init__(self, latency, tokens):
+        self.latency = latency
+        self.tokens = tokens
+
+    async def create(self, model, messages, stream=False, stream_options=None):
+        prompt_tokens = sum(len(message["content"]) for message in messages) // 4
+        words = ["Dette", "er", "et", "testsvar", "fra", "lasttesten."] * (self.tokens // 6 + 1)
+        words = words[:self.tokens]
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=len(words))
+        if stream:
+            # First token after a tenth of the latency, the rest spread over the remainder
+            await asyncio.sleep(self.latency / 10)
+            include_usage = bool(stream_options and stream_options.get("include_usage"))
+            return StubStream([word + " " for word in words], 0.9 * self.latency / max(1, len(words)),
+                              usage if include_usage else None)
+        await asyncio.sleep(self.latency)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=" ".join(words)))],
+            usage=usage
+        )
+
+
+class StubAsyncOpenAI:
+    def __init__(self, latency, tokens):
+        self.chat = SimpleNamespace(completions=StubCompletions(latency, tokens))
+
+    async def close(self):
+        pass
+
+
+def serve(args):
+    use_stand_in_database()
+    # bot_utils resolves the CSV relative to src/
+    os.chdir(SRC_DIR)
+    import chromadb
+    from utils import bot_utils
+
+    embedding_function = StubEmbeddingFunction()
+    collection = chromadb.EphemeralClient().get_or_create_collection(
+        name="item_collection", embedding_function=embedding_function)
+    # The lazy getters in bot_utils return these instead of creating the real backends
+    bot_utils._embedding_function = embedding_function
+    bot_utils._collection = collection
+    bot_utils._async_client = StubAsyncOpenAI(args.llm_latency, args.llm_tokens)
+    bot_utils.sync_csv_to_chroma(collection, CSV_FILE)
+
+    import uvicorn
+    from main import create_app
+    uvicorn.run(create_app("all"), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+# Load generator
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return round(1000 * sorted_values[index], 2)
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}  # route -> list of (latency, status)
+
+    async def request(self, client, method, url, route, **kwargs):
+        start = time.perf_counter()
+        try:
+            if kwargs.pop("stream", False):
+                async with client.stream(method, url, **kwargs) as response:
+                    async for _ in response.aiter_bytes():
+                        pass
+            else:
+                response = await client.request(method, url, **kwargs)
+            status = response.status_code
+        except Exception:
+            response, status = None, 0
+        self.samples.setdefault(route, []).append((time.perf_counter() - start, status))
+        return response if status and status < 400 else None
+
+
+class Workload:
+    """Weighted mix of scenarios. Write scenarios clean up the rows they create, so runs are repeatable."""
+
+    def __init__(self, recorder, ids, questions, rng, include_query=True):
+        self.r = recorder
+        self.ids = ids
+        self.questions = questions
+        self.rng = rng
+        scenarios = [
+            (20, self.read_categories), (20, self.read_items), (20, self.read_rules),
+            (3, self.category_cycle), (3, self.item_cycle), (3, self.rule_cycle),
+            (1, self.item_bulk_cycle), (1, self.rule_bulk_cycle), (1, self.tag_cleanup_cycle),
+        ]
+        if include_query:
+            scenarios += [(8, self.query), (4, self.query_stream)]
+        self.scenarios = [scenario for weight, scenario in scenarios for _ in range(weight)]
+
+    def pick(self, key):
+        return self.rng.choice(self.ids[key])
+
+    async def run_one(self, client):
+        await self.rng.choice(self.scenarios)(client)
+
+    async def read_categories(self, c):
+        await self.r.request(c, "GET", "/", "GET /")
+        await self.r.request(c, "GET", "/kategorier/read/", "GET /kategorier/read/")
+        await self.r.request(c, "GET", "/kategorier/read/?limit=5", "GET /kategorier/read/?limit")
+        await self.r.request(c, "GET", "/kategorier/read/stream", "GET /kategorier/read/stream", stream=True)
+        await self.r.request(c, "GET", f"/kategorier/read/id/{self.pick('kategori')}", "GET /kategorier/read/id/{kategoriid}")
+
+    async def read_items(self, c):
+        await self.r.request(c, "GET", "/gjenstander/read/?limit=50", "GET /gjenstander/read/?limit")
+        await self.r.request(c, "GET", "/gjenstander/read/", "GET /gjenstander/read/")
+        await self.r.request(c, "GET", "/gjenstander/read/stream", "GET /gjenstander/read/stream", stream=True)
+        await self.r.request(c, "GET", f"/gjenstander/read/id/{self.pick('gjenstand')}", "GET /gjenstander/read/id/{gjenstandid}")
+        await self.r.request(c, "GET", f"/gjenstander/read/navn/{quote(self.pick('navn'), safe='')}", "GET /gjenstander/read/navn/{gjenstandnavn}")
+        await self.r.request(c, "GET", f"/gjenstander/read/kategori/{self.pick('kategori')}", "GET /gjenstander/read/kategori/{kategoriid}")
+
+    async def read_rules(self, c):
+        await self.r.request(c, "GET", "/regelverker/read/", "GET /regelverker/read/")
+        await self.r.request(c, "GET", "/regelverker/read/?limit=50", "GET /regelverker/read/?limit")
+        await self.r.request(c, "GET", "/regelverker/read/stream", "GET /regelverker/read/stream", stream=True)
+        await self.r.request(c, "GET", f"/regelverker/read/id/{self.pick('regelverk')}", "GET /regelverker/read/id/{regelverkid}")
+        await self.r.request(c, "GET", f"/regelverker/read/kategori/{self.pick('kategori')}", "GET /regelverker/read/kategori/{kategoriid}")
+        await self.r.request(c, "GET", f"/regelverker/read/{self.pick('gjenstand')}", "GET /regelverker/read/{gjenstandid}")
+
+    async def category_cycle(self, c):
+        body = {"kategorinavn": "Lasttest", "kategoribeskrivelse": "Opprettet av lasttesten"}
+        created = await self.r.request(c, "POST", "/kategorier/", "POST /kategorier/", json=body)
+        if created is None:
+            return
+        kategoriid = created.json()["kategoriid"]
+        await self.r.request(c, "PUT", f"/kategorier/update/{kategoriid}", "PUT /kategorier/update/{kategoriid}", json=body)
+        await self.r.request(c, "DELETE", f"/kategorier/delete/{kategoriid}", "DELETE /kategorier/delete/{kategoriid}")
+
+    def new_item(self):
+        return {"gjenstandnavn": f"Lasttest {self.rng.randint(0, 10 ** 6)}",
+                "gjenstandbeskrivelse": "Opprettet av lasttesten", "kategoriid": self.pick('kategori')}
+
+    def new_rule(self):
+        return {"kategoriid": self.pick('kategori'), "betingelse": "Lasttest", "verdi": "true",
+                "tillatthandbagasje": True, "tillattinnsjekketbagasje": False,
+                "regelverkbeskrivelse": "Opprettet av lasttesten"}
+
+    async def item_cycle(self, c):
+        created = await self.r.request(c, "POST", "/gjenstander/", "POST /gjenstander/", json=self.new_item())
+        if created is None:
+            return
+        gjenstandid = created.json()["gjenstandid"]
+        await self.r.request(c, "PUT", f"/gjenstander/update/{gjenstandid}", "PUT /gjenstander/update/{gjenstandid}",
+                             json=self.new_item())
+        await self.r.request(c, "DELETE", f"/gjenstander/delete/{gjenstandid}", "DELETE /gjenstander/delete/{gjenstandid}")
+
+    async def rule_cycle(self, c):
+        created = await self.r.request(c, "POST", "/regelverker/", "POST /regelverker/", json=self.new_rule())
+        if created is None:
+            return
+        regelverkid = created.json()["regelverkid"]
+        await self.r.request(c, "PUT", f"/regelverker/update/{regelverkid}", "PUT /regelverker/update/{regelverkid}",
+                             json=self.new_rule())
+        tag = {"gjenstandid": self.pick('gjenstand'), "regelverkid": regelverkid}
+        await self.r.request(c, "POST", "/regelverktag/", "POST /regelverktag/", json=tag)
+        await self.r.request(c, "DELETE", "/regelverktag/delete", "DELETE /regelverktag/delete", json=tag)
+        await self.r.request(c, "DELETE", f"/regelverker/delete/{regelverkid}", "DELETE /regelverker/delete/{regelverkid}")
+
+    async def item_bulk_cycle(self, c):
+        created = await self.r.request(c, "POST", "/gjenstander/bulk/", "POST /gjenstander/bulk/",
+                                       json=[self.new_item() for _ in range(10)])
+        if created is None:
+            return
+        ids = [result["id"] for result in created.json()["results"] if result["id"] is not None]
+        await self.r.request(c, "PUT", "/gjenstander/bulk/update", "PUT /gjenstander/bulk/update",
+                             json=[{**self.new_item(), "gjenstandid": gjenstandid} for gjenstandid in ids])
+        tags = [{"gjenstandid": gjenstandid, "regelverkid": self.pick('regelverk')} for gjenstandid in ids]
+        await self.r.request(c, "POST", "/regelverktag/bulk/", "POST /regelverktag/bulk/", json=tags)
+        await self.r.request(c, "DELETE", "/regelverktag/bulk/delete", "DELETE /regelverktag/bulk/delete", json=tags)
+        await self.r.request(c, "DELETE", "/gjenstander/bulk/delete", "DELETE /gjenstander/bulk/delete", json={"ids": ids})
+
+    async def rule_bulk_cycle(self, c):
+        created = await self.r.request(c, "POST", "/regelverker/bulk/", "POST /regelverker/bulk/",
+                                       json=[self.new_rule() for _ in range(10)])
+        if created is None:
+            return
+        ids = [result["id"] for result in created.json()["results"] if result["id"] is not None]
+        await self.r.request(c, "PUT", "/regelverker/bulk/update", "PUT /regelverker/bulk/update",
+                             json=[{**self.new_rule(), "regelverkid": regelverkid} for regelverkid in ids])
+        await self.r.request(c, "DELETE", "/regelverker/bulk/delete", "DELETE /regelverker/bulk/delete", json={"ids": ids})
+
+    # Deletes by item and by rule only touch rows created here, never the seeded tags
+    async def tag_cleanup_cycle(self, c):
+        item = await self.r.request(c, "POST", "/gjenstander/", "POST /gjenstander/", json=self.new_item())
+        rule = await self.r.request(c, "POST", "/regelverker/", "POST /regelverker/", json=self.new_rule())
+        if item is None or rule is None:
+            return
+        gjenstandid, regelverkid = item.json()["gjenstandid"], rule.json()["regelverkid"]
+        tag = {"gjenstandid": gjenstandid, "regelverkid": regelverkid}
+        await self.r.request(c, "POST", "/regelverktag/", "POST /regelverktag/", json=tag)
+        await self.r.request(c, "DELETE", "/regelverktag/item/delete", "DELETE /regelverktag/item/delete",
+                             json={"gjenstandid": gjenstandid})
+        await self.r.request(c, "POST", "/regelverktag/", "POST /regelverktag/", json=tag)
+        # The route takes the rule id in the gjenstandid field
+        await self.r.request(c, "DELETE", "/regelverktag/rule/delete", "DELETE /regelverktag/rule/delete",
+                             json={"gjenstandid": regelverkid})
+        await self.r.request(c, "DELETE", f"/gjenstander/delete/{gjenstandid}", "DELETE /gjenstander/delete/{gjenstandid}")
+        await self.r.request(c, "DELETE", f"/regelverker/delete/{regelverkid}", "DELETE /regelverker/delete/{regelverkid}")
+
+    async def query(self, c):
+        await self.r.request(c, "GET", f"/query/{quote(self.rng.choice(self.questions), safe='')}", "GET /query/{query}",
+                             headers={"X-Session-Id": f"loadtest-{self.rng.randint(0, 99)}"})
+
+    async def query_stream(self, c):
+        await self.r.request(c, "GET", f"/query/stream/{quote(self.rng.choice(self.questions), safe='')}", "GET /query/stream/{query}",
+                             headers={"X-Session-Id": f"loadtest-{self.rng.randint(0, 99)}"}, stream=True)
+
+
+def summarize(samples, duration):
+    def stats(values):
+        latencies = sorted(latency for latency, _ in values)
+        server_errors = sum(1 for _, status in values if status == 0 or status >= 500)
+        client_errors = sum(1 for _, status in values if 400 <= status < 500)
+        return {
+            "requests": len(values),
+            "rps": round(len(values) / duration, 2),
+            "error_rate": round(server_errors / len(values), 4),
+            "client_error_rate": round(client_errors / len(values), 4),
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "max_ms": percentile(latencies, 100),
+        }
+
+    everything = [sample for values in samples.values() for sample in values]
+    return stats(everything) if everything else {}, {route: stats(values) for route, values in sorted(samples.items())}
+
+
+async def drive(base_url, args):
+    import httpx
+    from testdata import test_data as td
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        deadline = time.monotonic() + args.startup_timeout
+        while True:
+            try:
+                if (await client.get("/readyz")).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError("The server did not become ready")
+            await asyncio.sleep(0.5)
+
+        ids = {
+            "kategori": [row["kategoriid"] for row in (await client.get("/kategorier/read/")).json()],
+            "gjenstand": [row["gjenstandid"] for row in (await client.get("/gjenstander/read/")).json()],
+            "regelverk": [row["regelverkid"] for row in (await client.get("/regelverker/read/")).json()],
+        }
+        ids["navn"] = [name[:4] for name in {row["gjenstandnavn"] for row in (await client.get("/gjenstander/read/")).json()}]
+
+        recorder = Recorder()
+        rng = random.Random(args.seed)
+        workload = Workload(recorder, ids, td.test_questions, rng, include_query=not args.crud_only)
+
+        async def user():
+            while time.monotonic() < stop_at:
+                await workload.run_one(client)
+
+        # Warm-up traffic is not recorded
+        stop_at = time.monotonic() + args.rampup
+        await asyncio.gather(*(user() for _ in range(args.concurrency)))
+        recorder.samples.clear()
+
+        start = time.monotonic()
+        stop_at = start + args.duration
+        await asyncio.gather(*(user() for _ in range(args.concurrency)))
+        elapsed = time.monotonic() - start
+
+        server_stats = {}
+        for path in ["/stats/db", "/stats/cache", "/stats/rules", "/stats/index"]:
+            try:
+                server_stats[path] = (await client.get(path)).json()
+            except Exception as e:
+                server_stats[path] = str(e)
+    return recorder.samples, elapsed, server_stats
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=TEST_DIR, text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(previous_file, result):
+    with open(previous_file) as f:
+        previous = json.load(f)
+    print(f"\nCompared with {previous_file} ({previous.get('git_commit')}, {previous.get('timestamp')}):")
+    print(f"{'route':55} {'rps':>18} {'p95 ms':>20}")
+    for route, current in [("TOTAL", result["total"])] + list(result["routes"].items()):
+        before = previous["total"] if route == "TOTAL" else previous["routes"].get(route)
+        if not before:
+            continue
+        print(f"{route:55} {before['rps']:>8} -> {current['rps']:<8} {before['p95_ms']:>9} -> {current['p95_ms']:<9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Smartpack API with stubbed LLM and embeddings")
+    parser.add_argument("--concurrency", type=int, default=16, help="Simulated users sending requests back to back")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of measured traffic")
+    parser.add_argument("--rampup", type=float, default=5.0, help="Seconds of unrecorded warm-up traffic")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds the stubbed model takes per answer")
+    parser.add_argument("--llm-tokens", type=int, default=60, help="Tokens in each stubbed answer")
+    parser.add_argument("--crud-only", action="store_true", help="Leave out /query and /query/stream")
+    parser.add_argument("--label", default="", help="Free text stored with the results, e.g. the change under test")
+    parser.add_argument("--output", help="JSON file to write, default testresults/load_test/<timestamp>.json")
+    parser.add_argument("--compare", help="Earlier JSON result to print deltas against")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    use_stand_in_database()
+    seeded = create_stand_in_database()
+    port = free_port()
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port),
+                               "--llm-latency", str(args.llm_latency), "--llm-tokens", str(args.llm_tokens)])
+    try:
+        samples, elapsed, server_stats = asyncio.run(drive(f"http://127.0.0.1:{port}", args))
+    finally:
+        server.terminate()
+        server.wait(30)
+
+    total, routes = summarize(samples, elapsed)
+    timestamp = time.strftime("%Y-%m-%dT%H-%M-%S")
+    result = {
+        "timestamp": timestamp,
+        "git_commit": git_commit(),
+        "label": args.label,
+        "config": {key: value for key, value in vars(args).items() if key not in ("serve", "port", "output", "compare")},
+        "dataset": seeded,
+        "duration_s": round(elapsed, 2),
+        "total": total,
+        "routes": routes,
+        "server_stats": server_stats,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{timestamp}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+
+    print(f"{'route':55} {'requests':>9} {'rps':>8} {'err':>7} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for route, stats in [("TOTAL", total)] + list(routes.items()):
+        print(f"{route:55} {stats['requests']:>9} {stats['rps']:>8} {stats['error_rate']:>7} "
+              f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8}")
+    print(f"\nResults saved to {output}")
+    if args.compare:
+        compare(args.compare, result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# Recall and latency of dense-only Chroma search vs. hybrid lexical + dense search (utils.lexical_index).
+# Questions are labelled with the item names that should be retrieved, no LLM calls are made.
+import os
+import sys
+import time
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(TEST_DIR, "..", "src")
+sys.path.insert(0, SRC_DIR)
+sys.path.insert(0, TEST_DIR)
+# bot_utils resolves the CSV and the Chroma store relative to src/
+os.chdir(SRC_DIR)
+
+from utils import bot_utils  # noqa: E402
+from utils.lexical_index import hybrid_search, lexical_index  # noqa: E402
+from testdata.labelled_questions import LABELLED_QUESTIONS  # noqa: E402
+
+OUTPUT_FILE = os.path.join(TEST_DIR, "testresults", "retrieval_benchmark.txt")
+N_RESULTS = 5
+REPEATS = 5
+
+
+def dense_search(query, embedding, n_results=N_RESULTS):
+    return bot_utils.collection.query(query_embeddings=[embedding], n_results=n_results)
+
+
+def evaluate(search, embeddings):
+    found = expected = hits = 0
+    exact_first = 0
+    timings = []
+    for question, names in LABELLED_QUESTIONS.items():
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            results = search(question, embeddings[question])
+            timings.append(time.perf_counter() - start)
+        retrieved = results['documents'][0]
+        found += sum(1 for name in names if name in retrieved)
+        expected += len(names)
+        hits += len(retrieved)
+        exact_first += bool(retrieved) and retrieved[0] in names
+    timings.sort()
+    return {
+        "recall": found / expected,
+        "top1": exact_first / len(LABELLED_QUESTIONS),
+        "hits": hits / len(LABELLED_QUESTIONS),
+        "p50": 1000 * timings[len(timings) // 2],
+        "p95": 1000 * timings[int(len(timings) * 0.95)],
+    }
+
+
+if __name__ == "__main__":
+    # Embeddings are computed once, both searches get the same vector as /query does
+    embeddings = {question: bot_utils.embed_query(question) for question in LABELLED_QUESTIONS}
+    start = time.perf_counter()
+    lexical_index.search("warmup")
+    build_time = time.perf_counter() - start
+
+    results = {
+        "Dense (Chroma)": evaluate(dense_search, embeddings),
+        "Hybrid (BM25 + Chroma)": evaluate(hybrid_search, embeddings),
+    }
+
+    with open(OUTPUT_FILE, "w") as f:
+        f.write("=" * 50 + "\n")
+        f.write(" " * 12 + "RETRIEVAL BENCHMARK\n")
+        f.write("=" * 50 + "\n\n")
+        f.write(f"Labelled questions: {len(LABELLED_QUESTIONS)}, n_results: {N_RESULTS}, repeats: {REPEATS}\n")
+        f.write(f"Lexical index build: {1000 * build_time:.1f} ms for {lexical_index.stats['docs']} documents\n\n")
+        for name, result in results.items():
+            f.write(f"{name.upper()}\n")
+            f.write("-" * 50 + "\n")
+            f.write(f"Recall: {result['recall']:.3f}\n")
+            f.write(f"Expected item ranked first: {result['top1']:.3f}\n")
+            f.write(f"Average hits in prompt: {result['hits']:.2f}\n")
+            f.write(f"Search latency p50: {result['p50']:.2f} ms, p95: {result['p95']:.2f} ms\n\n")
+        f.write(f"Hybrid searches answered by exact name match: {lexical_index.stats['exact_matches']}"
+                f" of {lexical_index.stats['searches']}\n")
+        f.write("=" * 50 + "\n")
+
+    print(open(OUTPUT_FILE).read())
@@ -0,0 +1,112 @@
+# Micro-benchmark: pandas DataFrame reads vs. the cursor row-mapping fast path in sql.py
+# Runs against an in-memory sqlite copy of src/data/c.csv, so no Postgres is needed.
+import csv
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+import tracemalloc
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(TEST_DIR, "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+import sql as sql_module  # noqa: E402
+
+CSV_FILE = os.path.join(SRC_DIR, "data", "c.csv")
+OUTPUT_FILE = os.path.join(TEST_DIR, "testresults", "sql_fetch_benchmark.txt")
+ITERATIONS = 2000
+
+CATEGORY_BY_ID = """
+SELECT kategoriid, navn AS kategorinavn, beskrivelse AS kategoribeskrivelse
+FROM kategorier
+WHERE kategoriid = ?;
+"""
+RULES_BY_ITEM = """
+SELECT reg.regelverkid, reg.kategoriid, reg.betingelse, reg.verdi, reg.tillatthandbagasje,
+       reg.tillattinnsjekketbagasje, COALESCE(reg.beskrivelse, '') AS regelverkbeskrivelse
+FROM regelverker reg
+INNER JOIN regelverktag rtag ON reg.regelverkid = rtag.regelverkid
+WHERE rtag.gjenstandid = ?
+ORDER BY reg.regelverkid;
+"""
+ALL_ITEMS = """
+SELECT gjenstandid, gjenstandnavn, beskrivelse AS gjenstandbeskrivelse, kategoriid
+FROM gjenstander
+ORDER BY gjenstandnavn;
+"""
+
+
+def load_database():
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    conn.executescript("""
+    CREATE TABLE kategorier (kategoriid INTEGER PRIMARY KEY, navn TEXT, beskrivelse TEXT);
+    CREATE TABLE gjenstander (gjenstandid INTEGER PRIMARY KEY, gjenstandnavn TEXT, beskrivelse TEXT, kategoriid INTEGER);
+    CREATE TABLE regelverker (regelverkid INTEGER PRIMARY KEY, kategoriid INTEGER, betingelse TEXT, verdi TEXT,
+                              tillatthandbagasje BOOLEAN, tillattinnsjekketbagasje BOOLEAN, beskrivelse TEXT);
+    CREATE TABLE regelverktag (regelverktagid INTEGER PRIMARY KEY, gjenstandid INTEGER, regelverkid INTEGER);
+    """)
+    with open(CSV_FILE, newline='') as csvfile:
+        for row in csv.DictReader(csvfile):
+            conn.execute("INSERT OR IGNORE INTO kategorier VALUES (?, ?, ?)",
+                         (row['gjenstandkategoriid'], row['kategorinavn'], row['kategoribeskrivelse']))
+            conn.execute("INSERT OR IGNORE INTO gjenstander VALUES (?, ?, ?, ?)",
+                         (row['gjenstandid'], row['gjenstandnavn'], row['gjenstandbeskrivelse'],
+                          row['gjenstandkategoriid']))
+            conn.execute("INSERT OR IGNORE INTO regelverker VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (row['regelverkid'], row['gjenstandkategoriid'], row['betingelse'], row['verdi'],
+                          row['tillatthandbagasje'] == 'True', row['tillattinnsjekketbagasje'] == 'True',
+                          row['regelverkbeskrivelse']))
+            conn.execute("INSERT INTO regelverktag (gjenstandid, regelverkid) VALUES (?, ?)",
+                         (row['gjenstandid'], row['regelverkid']))
+    conn.commit()
+    return conn
+
+
+def measure(name, func, iterations=ITERATIONS):
+    func()  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    per_call_us = (time.perf_counter() - start) / iterations * 1_000_000
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return name, per_call_us, peak / 1024
+
+
+def pandas_import_time():
+    cmd = [sys.executable, "-c", "import time; t = time.perf_counter(); import pandas; print(time.perf_counter() - t)"]
+    return float(subprocess.check_output(cmd).decode().strip()) * 1000
+
+
+if __name__ == "__main__":
+    conn = load_database()
+
+    cases = [
+        measure("get_category  pandas", lambda: sql_module.execute_query(conn, CATEGORY_BY_ID, (7,)).iloc[0].to_dict()),
+        measure("get_category  fetch_one", lambda: sql_module.fetch_one(conn, CATEGORY_BY_ID, (7,))),
+        measure("get_rules     pandas", lambda: sql_module.execute_query(conn, RULES_BY_ITEM, (3,)).to_dict(orient='records')),
+        measure("get_rules     fetch_rows", lambda: sql_module.fetch_rows(conn, RULES_BY_ITEM, (3,))),
+        measure("all_items     pandas", lambda: sql_module.execute_query(conn, ALL_ITEMS).to_dict(orient='records'), 500),
+        measure("all_items     fetch_rows", lambda: sql_module.fetch_rows(conn, ALL_ITEMS), 500),
+        measure("all_items     fetch_rows tuples", lambda: sql_module.fetch_rows(conn, ALL_ITEMS, as_dict=False), 500),
+    ]
+    import_ms = pandas_import_time()
+
+    with open(OUTPUT_FILE, "w") as f:
+        f.write("=" * 50 + "\n")
+        f.write(" " * 12 + "SQL FETCH PATH BENCHMARK\n")
+        f.write("=" * 50 + "\n\n")
+        f.write(f"{'Case':<34}{'us/call':>8}{'peak KiB':>10}\n")
+        f.write("-" * 52 + "\n")
+        for name, per_call_us, peak_kib in cases:
+            f.write(f"{name:<34}{per_call_us:>8.1f}{peak_kib:>10.1f}\n")
+        f.write("\n")
+        f.write(f"One-off pandas import (avoided by the fast path): {import_ms:.1f} ms\n")
+        f.write("=" * 50 + "\n")
+
+    print(open(OUTPUT_FILE).read())
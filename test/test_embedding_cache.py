@@ -0,0 +1,39 @@
+# Unit tests for the on-disk document embedding cache, run with: python -m pytest test
+import os
+import sys
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TEST_DIR, "..", "src"))
+
+from utils.embedding_cache import EmbeddingCache  # noqa: E402
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def test_only_texts_missing_from_the_cache_are_embedded(tmp_path):
+    cache = EmbeddingCache("test_embeddings", path=str(tmp_path / "embeddings.sqlite3"))
+    embed = CountingEmbedder()
+    assert cache.embed("model", ["Lighter", "Saks", "Lighter"], embed) == [[7.0, 1.0], [4.0, 1.0], [7.0, 1.0]]
+    assert embed.calls == [["Lighter", "Saks"]]
+
+    assert cache.embed("model", ["Saks", "Kniv"], embed) == [[4.0, 1.0], [4.0, 1.0]]
+    assert embed.calls[-1] == ["Kniv"]
+    assert (cache.hits, cache.misses) == (2, 3)
+
+
+def test_cache_survives_a_restart_and_is_keyed_by_model(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    EmbeddingCache("test_embeddings", path=path).embed("model", ["Lighter"], CountingEmbedder())
+    embed = CountingEmbedder()
+    cache = EmbeddingCache("test_embeddings", path=path)
+    cache.embed("model", ["Lighter"], embed)
+    assert embed.calls == []
+    cache.embed("other-model", ["Lighter"], embed)
+    assert embed.calls == [["Lighter"]]
@@ -0,0 +1,48 @@
+# Unit tests for the debounce in utils.index_sync, run with: python -m pytest test
+import os
+import sys
+import threading
+import time
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TEST_DIR, "..", "src"))
+
+from utils.index_sync import IndexSyncQueue  # noqa: E402
+
+
+class RecordingQueue(IndexSyncQueue):
+    """Records the batches instead of touching the database and Chroma."""
+
+    def __init__(self, debounce):
+        super().__init__(debounce)
+        self.batches = []
+        self.synced = threading.Event()
+
+    def sync(self, pending):
+        self.batches.append({kind: set(ids) for kind, ids in pending.items()})
+        self.synced.set()
+
+
+def test_a_burst_of_edits_is_synced_as_one_batch():
+    queue = RecordingQueue(debounce=1.0)
+    queue.start()
+    try:
+        # 50 edits over 0.5 s, well within one debounce interval
+        for item in range(50):
+            queue.enqueue("gjenstand", item)
+            time.sleep(0.01)
+        assert queue.synced.wait(5.0)
+    finally:
+        queue.stop()
+    assert len(queue.batches) == 1
+    assert queue.batches[0]["gjenstand"] == set(range(50))
+
+
+def test_stop_flushes_without_waiting_for_the_debounce():
+    queue = RecordingQueue(debounce=30.0)
+    queue.start()
+    queue.enqueue("regelverk", 7)
+    start = time.monotonic()
+    queue.stop()
+    assert time.monotonic() - start < 5.0
+    assert queue.batches == [{"gjenstand": set(), "regelverk": {7}, "kategori": set()}]
@@ -0,0 +1,76 @@
+# Unit tests for utils.lexical_index.merge_results on the item CSV, run with: python -m pytest test
+import csv
+import os
+import sys
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(TEST_DIR, "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from utils import bot_utils  # noqa: E402
+from utils.lexical_index import EXACT_MATCH_RESULTS, LexicalIndex, merge_results  # noqa: E402
+
+CSV_FILE = os.path.join(SRC_DIR, "data", "c.csv")
+N_RESULTS = 5
+
+
+def load_rows():
+    with open(CSV_FILE, newline='') as csvfile:
+        return [(bot_utils.row_id(row), *bot_utils.row_to_document(row)) for row in csv.DictReader(csvfile)]
+
+
+ROWS = load_rows()
+INDEX = LexicalIndex()
+INDEX.load(*zip(*ROWS))
+
+
+# Chroma-shaped dense results holding the rows of the given items, in that order
+def dense_for(*names):
+    hits = [(doc_id, document, metadata) for name in names for doc_id, document, metadata in ROWS if document == name]
+    hits = hits[:2 * N_RESULTS]
+    return {
+        'ids': [[doc_id for doc_id, _, _ in hits]],
+        'documents': [[document for _, document, _ in hits]],
+        'metadatas': [[metadata for _, _, metadata in hits]],
+        'distances': [[0.1 * rank for rank in range(len(hits))]],
+    }
+
+
+def search(question, *dense_names):
+    return merge_results(question, dense_for(*dense_names), N_RESULTS, index=INDEX)
+
+
+def item_id(name):
+    return next(metadata["gjenstandid"] for _, document, metadata in ROWS if document == name)
+
+
+def test_items_with_many_rows_stay_within_n_results():
+    for question, name in [("Hvor mange lightere er lov?", "Lighter"), ("Kan jeg ta med powerbank?", "Powerbank")]:
+        results = search(question, name)
+        documents = results['documents'][0]
+        assert len(documents) <= N_RESULTS
+        assert documents[:EXACT_MATCH_RESULTS] == [name] * EXACT_MATCH_RESULTS
+        assert item_id(name) in results['name_matches']
+
+
+def test_named_items_share_the_exact_match_slots():
+    results = search("Kan jeg ta med PC og mobiltelefon?", "Mobiltelefon", "PC")
+    documents = results['documents'][0]
+    assert len(documents) <= N_RESULTS
+    assert {"PC", "Mobiltelefon"} <= set(documents[:EXACT_MATCH_RESULTS])
+    assert set(results['name_matches']) == {item_id("PC"), item_id("Mobiltelefon")}
+
+
+def test_common_words_are_not_name_matches_without_dense_support():
+    results = search("Hvor bor du?")
+    assert item_id("Bor") not in results['name_matches']
+
+    results = search("Jeg bor i Bergen, kan jeg ta med brunost?", "Brunost")
+    assert item_id("Bor") not in results['name_matches']
+    assert results['documents'][0][0] == "Brunost"
+
+
+def test_dense_results_are_always_merged():
+    results = search("Hvor mange lightere er lov?", "Gasslighter", "Lighter")
+    assert len(results['documents'][0]) == N_RESULTS
+    assert "Gasslighter" in results['documents'][0]
@@ -0,0 +1,43 @@
+# Unit tests for the rule engine fast path decision, run with: python -m pytest test
+import os
+import sys
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TEST_DIR, "..", "src"))
+sys.path.insert(0, TEST_DIR)
+
+from utils.rule_engine import confident_item, format_answer  # noqa: E402
+from test_lexical_index import item_id, search  # noqa: E402
+
+
+def test_permission_question_about_one_item_is_answered_from_the_rules():
+    question = "Hvor mange lightere er lov?"
+    assert confident_item(question, search(question, "Lighter")) == item_id("Lighter")
+
+
+def test_common_word_collisions_fall_through_to_the_model():
+    # "bor" is also the item Bor (drill bit)
+    for question, dense in [("Hvor bor du?", ["Bor"]), ("Hvor bor du?", []),
+                            ("Jeg bor i Bergen, kan jeg ta med brunost?", ["Brunost", "Bor"]),
+                            ("Er det mine?", ["Mine"])]:
+        assert confident_item(question, search(question, *dense)) is None, question
+
+
+def test_questions_naming_several_items_fall_through_to_the_model():
+    question = "Kan jeg ta med PC og mobiltelefon?"
+    assert confident_item(question, search(question, "Mobiltelefon", "PC")) is None
+
+
+def rule(verdi, hand="true", checked="true", betingelse="BladLengde"):
+    return {"gjenstandnavn": "Neglklipper", "betingelse": betingelse, "verdi": verdi,
+            "tillatthandbagasje": hand, "tillattinnsjekketbagasje": checked, "regelverkbeskrivelse": ""}
+
+
+def test_single_conditional_rule_keeps_its_limit():
+    assert format_answer([rule("x<6cm")]) == \
+        "Neglklipper er tillatt både i håndbagasjen og i innsjekket bagasje (BladLengde x<6cm)."
+
+
+def test_single_plain_rule_has_no_limit():
+    for verdi in ["true", "", None]:
+        assert format_answer([rule(verdi)]) == "Neglklipper er tillatt både i håndbagasjen og i innsjekket bagasje."
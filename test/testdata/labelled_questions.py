@@ -0,0 +1,35 @@
+# Question from test_data.py -> item names (gjenstandnavn) that answer it
+LABELLED_QUESTIONS = {
+    "Hvilke type ammunisjon er det mulig å medbringe?": ["Ammunisjon"],
+    "Er det ulike regler for barberblader og barberhøvler?": ["Barberblader", "Barberhøvel"],
+    "Kan man ta med sånn bilijard pinne?": ["Biljardkø"],
+    "Er deo lov?": ["Deodorant"],
+    "Hva er reglene for krutt og sprengstoff?": ["Krutt", "Sprengstoff"],
+    "Teller lotion som flytende?": ["Lotion"],
+    "Kan jeg ta med kjeks?": ["Tørre kjeks"],
+    "Hvor mange lightere er lov?": ["Lighter"],
+    "Er det samme regler for luftpistol som vanlig pistol?": ["Luftpistol"],
+    "Kan jeg ta med røykgranater?": ["Røykbombe"],
+    "Er saks, sag, kniv og gaffel lov?": ["Saks", "Sag", "Kniv"],
+    "Jeg har tenkt til å te med skøyter. De har beskyttelse over den skarpe delen. Greit?": ["Skøyte"],
+    "Var i hønefoss og kjøpte 20 kg smør jeg.": ["Smør"],
+    "Teller skalpel som skrap gjenstand?": ["Skalpell"],
+    "Da er det blåselampe tid.": ["Blåselampe"],
+    "Bær": ["Bær"],
+    "Kan jeg ta med redningsvesten min?": ["Redningsvest"],
+    "Kan jeg ta med kaviar eller er det flytende?": ["Kaviar på tube"],
+    "Kan jeg ta med telt i pakket bagasje?": ["Telt"],
+    "Teltplugger ok?": ["Teltplugg"],
+    "Er det lov å ta med både stearinlys og telys?": ["Stearinlys", "Telys"],
+    "Pinsett lov?": ["Pinsett"],
+    "Hvor mange slynger kan jeg ta med i baggen?": ["Slynge"],
+    "Er padleåre mulig å ta med i vanlig bagasje eller går det under spesialbagasje?": ["Padleåre"],
+    "Er det mulighet for å ta med biljardkø": ["Biljardkø"],
+    "Kan jeg ta med fyrstikker?": ["Fyrstikk"],
+    "Er økser lov?": ["Øks"],
+    "Jeg har brukket beinet og går på krykker. Kan jeg ta dem med på flyet?": ["Krykke"],
+    "Er smøre-ost lov å ta med på flyet?": ["Smøre-ost"],
+    "Ulovelig med skrujern på flyet?": ["Skrujern"],
+    "Er bunadsølje lov å ta med på turen?": ["Bunadssølje"],
+    "Jeg må ta med kastestjernene mine, er det greit?": ["Kastestjerne"],
+}
@@ -0,0 +1,105 @@
+# Throughput of the API with 1, 2 and 4 uvicorn workers (python main.py --workers N).
+# Needs the database from utils/constants.py; only read endpoints are called, no LLM calls are made.
+# The workers run with --role crud, so no shared Chroma server is needed.
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(TEST_DIR, "..", "src")
+OUTPUT_FILE = os.path.join(TEST_DIR, "testresults", "worker_scaling_benchmark.txt")
+
+PORT = 8765
+WORKER_COUNTS = [1, 2, 4]
+CLIENT_THREADS = 32
+DURATION = 20.0
+# Endpoints hit in turn by every client thread
+ENDPOINTS = [
+    "/gjenstander/read/?limit=100",
+    "/kategorier/read/",
+    "/regelverker/read/1",
+    "/regelverker/read/kategori/1",
+]
+
+
+def start_server(workers):
+    process = subprocess.Popen(
+        [sys.executable, "main.py", "--workers", str(workers), "--port", str(PORT), "--role", "crud"],
+        cwd=SRC_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            if requests.get(f"http://127.0.0.1:{PORT}/readyz", timeout=1).status_code == 200:
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"Server with {workers} workers did not start")
+
+
+def client(stop, counts, latencies, lock):
+    session = requests.Session()
+    i = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            ok = session.get(f"http://127.0.0.1:{PORT}{ENDPOINTS[i % len(ENDPOINTS)]}", timeout=10).status_code < 500
+        except requests.RequestException:
+            ok = False
+        with lock:
+            latencies.append(time.perf_counter() - start)
+            counts["ok" if ok else "failed"] += 1
+        i += 1
+
+
+def run(workers):
+    process = start_server(workers)
+    try:
+        stop = threading.Event()
+        counts = {"ok": 0, "failed": 0}
+        latencies = []
+        lock = threading.Lock()
+        threads = [threading.Thread(target=client, args=(stop, counts, latencies, lock)) for _ in range(CLIENT_THREADS)]
+        for thread in threads:
+            thread.start()
+        time.sleep(DURATION)
+        stop.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        process.terminate()
+        process.wait(30)
+    latencies.sort()
+    return {
+        "rps": counts["ok"] / DURATION,
+        "failed": counts["failed"],
+        "p50": 1000 * latencies[len(latencies) // 2],
+        "p95": 1000 * latencies[int(len(latencies) * 0.95)],
+    }
+
+
+if __name__ == "__main__":
+    results = {workers: run(workers) for workers in WORKER_COUNTS}
+    baseline = results[WORKER_COUNTS[0]]["rps"]
+
+    with open(OUTPUT_FILE, "w") as f:
+        f.write("=" * 50 + "\n")
+        f.write(" " * 10 + "WORKER SCALING BENCHMARK\n")
+        f.write("=" * 50 + "\n\n")
+        f.write(f"Client threads: {CLIENT_THREADS}, duration per run: {DURATION}s, CPU cores: {os.cpu_count()}\n")
+        f.write(f"Endpoints: {', '.join(ENDPOINTS)}\n\n")
+        for workers, result in results.items():
+            f.write(f"{workers} WORKER(S)\n")
+            f.write("-" * 50 + "\n")
+            f.write(f"Throughput: {result['rps']:.1f} req/s ({result['rps'] / baseline:.2f}x)\n")
+            f.write(f"Latency p50: {result['p50']:.1f} ms, p95: {result['p95']:.1f} ms\n")
+            f.write(f"Failed requests: {result['failed']}\n\n")
+        f.write("=" * 50 + "\n")
+
+    print(open(OUTPUT_FILE).read())